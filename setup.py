@@ -82,7 +82,6 @@ setup(
         'psutil',
         'python-dateutil',
         'PyYAML',
-        'pycron',
         'importlib-metadata; python_version >= "3.8"'
     ],
     include_package_data=True,
@@ -17,12 +17,14 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
+import os
 import sys
 import time
 import getopt
 from sysinvest.common.monitor import Monitor
 from sysinvest.common.collector import Collector
-from queue import Queue
+from sysinvest.common.sharding import Supervisor
+from sysinvest.common.resultqueue import ResultQueue
 import sysinvest.common.api as API
 import sysinvest.version as version
 from sysinvest.common.configuration import ConfigLoader
@@ -44,15 +46,49 @@ Example:
 Options:
     -h/--help           This halp information
     -c/--config         generic configuration file
+    -w/--workers        number of worker processes, the objects are divided over
+                        the workers by the hash of their name
+    -o/--once           run all enabled objects once at the same time, report the
+                        results and exit, the exit code is 1 when a task failed
     -v                  verbose output
     
 """)
 
 
+def runOnce( configuration: ConfigLoader ) -> int:
+    processMonitor = Monitor( configuration )
+    collector = Collector( configuration )
+    started = time.monotonic()
+    try:
+        summary = processMonitor.runOnce()
+
+    finally:
+        processMonitor.shutdown()
+
+    collector.flush()
+    failures = 0
+    print( f"{'Task':40} {'Result':8} {'Duration':>10}" )
+    for name, result, duration in summary:
+        if result is not True:
+            failures += 1
+
+        state = 'NOT RUN' if result is None else ( 'OK' if result else 'FAILED' )
+        print( f"{name:40} {state:8} {'' if duration is None else f'{duration:9.3f}s':>10}" )
+
+    print( f"{len( summary )} tasks, {failures} failed, in {time.monotonic() - started:.3f}s" )
+    if processMonitor.Abandoned > 0:
+        # Timed out tasks are still running in worker threads, these cannot be joined
+        sys.stdout.flush()
+        configuration.stop()
+        os._exit( 1 )
+
+    return 1 if failures > 0 else 0
+
+
 def main():
     banner()
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hc:v", ["help", "config="])
+        opts, args = getopt.getopt(sys.argv[1:], "hc:w:ov", ["help", "config=", "workers=", "once"])
 
     except getopt.GetoptError as err:
         # print help information and exit:
@@ -61,6 +97,8 @@ def main():
         sys.exit(2)
 
     config = "config.conf"
+    workers = 0
+    once = False
     API.verbose = False
     for o, a in opts:
         if o == "-v":
@@ -73,15 +111,32 @@ def main():
         elif o in ("-c", "--config"):
             config = a
 
+        elif o in ("-w", "--workers"):
+            workers = int( a )
+
+        elif o in ("-o", "--once"):
+            once = True
+
         else:
             assert False, "unhandled option"
 
     configuration = ConfigLoader( config, *args )
     while configuration.isLoading:
-        time.sleep( 5 )
+        time.sleep( 0.1 )
+
+    cfg = configuration.Configuration.get( 'collector', {} )
+    API.QUEUE = ResultQueue( maxsize = cfg.get( 'queue_limit', 10000 ), backpressure = cfg.get( 'backpressure', 0 ) )
+    if once:
+        exitCode = runOnce( configuration )
+        configuration.stop()
+        sys.exit( exitCode )
+
+    if workers > 0:
+        processMonitor = Supervisor( configuration, workers, ( config, *args ) )
+
+    else:
+        processMonitor = Monitor( configuration )
 
-    API.QUEUE = Queue()
-    processMonitor = Monitor( configuration )
     collector = Collector( configuration )
     collector.start()
     processMonitor.run()
@@ -0,0 +1,96 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+import sys
+import getopt
+from sysinvest.benchmark.harness import runBenchmark, printReport
+
+
+def usage():
+    print("""Syntax:
+    python -m sysinvest.benchmark [options]
+
+Options:
+    -h/--help           This halp information
+    -o/--objects        comma separated numbers of objects, default 10,1000,10000
+    -d/--duration       seconds to run each configuration, default 60
+    -c/--cron           cron expression of the objects, default '*/10 * * * * *'
+    -l/--latency        mean latency of a check in seconds, default 0.05
+    -f/--failures       failure rate of the checks, default 0.0
+    -s/--size           result payload size in bytes, default 0
+    -r/--results        results per check run, default 1
+    -w/--workers        worker threads of the monitor, default 8
+""")
+
+
+def main():
+    try:
+        opts, args = getopt.getopt( sys.argv[1:], "ho:d:c:l:f:s:r:w:",
+                                    [ "help", "objects=", "duration=", "cron=", "latency=",
+                                      "failures=", "size=", "results=", "workers=" ] )
+
+    except getopt.GetoptError as err:
+        print( err )
+        usage()
+        sys.exit( 2 )
+
+    sizes = [ 10, 1000, 10000 ]
+    duration = 60
+    kwargs = {}
+    monitor = {}
+    for o, a in opts:
+        if o in ( "-h", "--help" ):
+            usage()
+            sys.exit()
+
+        elif o in ( "-o", "--objects" ):
+            sizes = [ int( size ) for size in a.split( ',' ) ]
+
+        elif o in ( "-d", "--duration" ):
+            duration = float( a )
+
+        elif o in ( "-c", "--cron" ):
+            kwargs[ 'cron' ] = a
+
+        elif o in ( "-l", "--latency" ):
+            kwargs[ 'latency' ] = { 'distribution': 'exponential', 'mean': float( a ), 'max': 20 * float( a ) }
+
+        elif o in ( "-f", "--failures" ):
+            kwargs[ 'failure_rate' ] = float( a )
+
+        elif o in ( "-s", "--size" ):
+            kwargs[ 'result_size' ] = int( a )
+
+        elif o in ( "-r", "--results" ):
+            kwargs[ 'results' ] = int( a )
+
+        elif o in ( "-w", "--workers" ):
+            monitor[ 'workers' ] = int( a )
+
+    reports = []
+    for size in sizes:
+        print( f"Running {size} objects for {duration} seconds" )
+        reports.append( runBenchmark( size, duration, monitor = monitor, **kwargs ) )
+
+    printReport( reports )
+    return
+
+
+if __name__ == '__main__':
+    main()
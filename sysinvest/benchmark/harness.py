@@ -0,0 +1,171 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import List, Optional
+import os
+import time
+import statistics
+import tempfile
+import threading
+import psutil
+import yaml
+import sysinvest.common.api as API
+import sysinvest.benchmark.reporter as benchmark
+from sysinvest.common.configuration import ConfigLoader
+from sysinvest.common.monitor import Monitor
+from sysinvest.common.collector import Collector
+from sysinvest.common.resultqueue import ResultQueue
+
+
+def generateConfig( objects: int, cron: str = '*/10 * * * * *', latency: Optional[dict] = None,
+                    failure_rate: float = 0.0, result_size: int = 0, results: int = 1,
+                    mode: str = 'sleep', monitor: Optional[dict] = None ) -> dict:
+    """A configuration with 'objects' synthetic objects reporting to the benchmark reporter"""
+    return {
+        'monitor': monitor or {},
+        # Only the errors are logged, the handlers filter so the log levels set by the modules do not matter
+        'logging': {
+            'version': 1,
+            'disable_existing_loggers': False,
+            'handlers': { 'console': { 'class': 'logging.StreamHandler', 'level': 'ERROR' } },
+            'root': { 'level': 'ERROR', 'handlers': [ 'console' ] },
+        },
+        'collector': {
+            'modules': [ 'benchmark.reporter' ],
+            'forward': [ 'reporter' ],
+            'benchmark': {},
+        },
+        'objects': [ {
+            'name':         f"synthetic-{index:06d}",
+            'module':       'monitor.synthetic',
+            'enabled':      True,
+            'cron':         cron,
+            'attributes': {
+                'latency':      latency or { 'distribution': 'exponential', 'mean': 0.05, 'max': 1.0 },
+                'failure_rate': failure_rate,
+                'result_size':  result_size,
+                'results':      results,
+                'mode':         mode,
+                'seed':         index,
+            }
+        } for index in range( objects ) ]
+    }
+
+
+class ResourceSampler( threading.Thread ):
+    """Samples the queue depth and the RSS and CPU usage of the agent"""
+    def __init__( self, interval: float = 1.0 ):
+        super().__init__( name = 'benchmark', daemon = True )
+        self.__interval = interval
+        self.__event    = threading.Event()
+        self.__process  = psutil.Process( os.getpid() )
+        self.depth      = []
+        self.rss        = []
+        self.cpu        = []
+        return
+
+    def stop( self ) -> None:
+        self.__event.set()
+        self.join()
+        return
+
+    def run( self ) -> None:
+        self.__process.cpu_percent()
+        while not self.__event.wait( self.__interval ):
+            self.depth.append( API.QUEUE.qsize() )
+            self.rss.append( self.__process.memory_info().rss )
+            self.cpu.append( self.__process.cpu_percent() )
+
+        return
+
+
+def _milliseconds( value: Optional[float] ) -> Optional[float]:
+    return None if value is None else round( value * 1000, 1 )
+
+
+def runBenchmark( objects: int, duration: float = 60, **kwargs ) -> dict:
+    """Runs the monitor and the collector in this process on a generated configuration,
+    returns the measurements"""
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join( directory, 'benchmark.conf' )
+        with open( filename, 'w' ) as stream:
+            yaml.safe_dump( generateConfig( objects, **kwargs ), stream )
+
+        configuration = ConfigLoader( filename )
+        while configuration.isLoading:
+            time.sleep( 0.1 )
+
+        cfg = configuration.Configuration.get( 'collector', {} )
+        API.QUEUE = ResultQueue( maxsize = cfg.get( 'queue_limit', 10000 ), backpressure = cfg.get( 'backpressure', 0 ) )
+        started = time.monotonic()
+        monitor = Monitor( configuration )
+        loaded = time.monotonic() - started
+        collector = Collector( configuration )
+        benchmark.reporter.reset()
+        sampler = ResourceSampler()
+        monitorThread = threading.Thread( target = monitor.run, name = 'monitor' )
+        cpu = psutil.Process( os.getpid() ).cpu_times()
+        collector.start()
+        monitorThread.start()
+        sampler.start()
+        time.sleep( duration )
+        sampler.stop()
+        monitor.stop()
+        monitorThread.join()
+        collector.stop()
+        collector.join()
+        configuration.stop()
+        used = psutil.Process( os.getpid() ).cpu_times()
+
+    delivery = benchmark.reporter.Delivery
+    lateness = monitor.Lateness
+    return {
+        'objects':          objects,
+        'duration':         duration,
+        'load_time':        round( loaded, 3 ),
+        'runs':             sum( task.Statistics.Runs for task in monitor ),
+        'timeouts':         sum( task.Statistics.Timeouts for task in monitor ),
+        'skipped':          sum( task.SkippedRuns for task in monitor ),
+        'results':          benchmark.reporter.Results,
+        'late_p50_ms':      _milliseconds( lateness.P50 ),
+        'late_p99_ms':      _milliseconds( lateness.P99 ),
+        'late_max_ms':      _milliseconds( lateness.Max ),
+        'delivery_p50_ms':  _milliseconds( delivery.P50 ),
+        'delivery_p99_ms':  _milliseconds( delivery.P99 ),
+        'delivery_max_ms':  _milliseconds( delivery.Max ),
+        'queue_max':        max( sampler.depth, default = 0 ),
+        'queue_mean':       round( statistics.mean( sampler.depth ), 1 ) if sampler.depth else 0,
+        'queue_dropped':    API.QUEUE.Dropped,
+        'queue_coalesced':  API.QUEUE.Coalesced,
+        'rss_max_mb':       round( max( sampler.rss, default = 0 ) / 2 ** 20, 1 ),
+        'cpu_mean':         round( statistics.mean( sampler.cpu ), 1 ) if sampler.cpu else 0,
+        'cpu_seconds':      round( ( used.user + used.system ) - ( cpu.user + cpu.system ), 2 ),
+    }
+
+
+def printReport( reports: List[ dict ] ) -> None:
+    if len( reports ) == 0:
+        return
+
+    columns = list( reports[ 0 ].keys() )
+    width = max( len( column ) for column in columns )
+    for column in columns:
+        print( f"{column:{width}} " + ' '.join( f"{str( report[ column ] ):>12}" for report in reports ) )
+
+    return
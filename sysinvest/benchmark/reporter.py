@@ -0,0 +1,81 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+import time
+from threading import Lock
+from sysinvest.common.plugin import PluginResult, ReportPlugin
+from sysinvest.common.runstats import RunStatistics
+
+REPORT_CLASS = 'BenchmarkReport'
+# The reporter of the running benchmark, for the harness
+reporter = None
+
+
+class BenchmarkReport( ReportPlugin ):
+    """Measures the time from the enqueue of a synthetic result to its delivery to the reporters"""
+    def __init__( self, config: dict ):
+        super().__init__( 'benchmark', config )
+        self.__lock = Lock()
+        self.reset()
+        global reporter
+        reporter = self
+        return
+
+    def reset( self ) -> None:
+        with self.__lock:
+            self.__delivery = RunStatistics()
+            self.__results = 0
+            self.__failures = 0
+            self.__publishes = 0
+
+        return
+
+    @property
+    def Delivery( self ) -> RunStatistics:
+        return self.__delivery
+
+    @property
+    def Results( self ) -> int:
+        return self.__results
+
+    @property
+    def Failures( self ) -> int:
+        return self.__failures
+
+    @property
+    def Publishes( self ) -> int:
+        return self.__publishes
+
+    def notify( self, result: PluginResult ):
+        enqueued = result.Details.get( 'enqueued' )
+        with self.__lock:
+            self.__results += 1
+            if not result.Result:
+                self.__failures += 1
+
+            if enqueued is not None:
+                self.__delivery.record( max( 0.0, time.time() - enqueued ), None, result.Result )
+
+        return
+
+    def publish( self ):
+        with self.__lock:
+            self.__publishes += 1
+
+        return
@@ -17,16 +17,20 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
+from typing import List, Optional, Union
 import time
 import logging
 from datetime import datetime
-from sysinvest.common.plugin.result import PluginResult
+from sysinvest.common.plugin.result import PluginResult, PluginResultBatch
 import importlib
+from functools import partial
 import _queue
 import threading
 import ctypes
 import sysinvest.common.api as API
 from sysinvest.common.configuration import ConfigLoader
+from sysinvest.common.initializer import ParallelInitializer
+from sysinvest.common.reporterworker import ReporterWorker
 
 
 def _async_raise( tid, excobj ):
@@ -54,28 +58,51 @@ class Collector( threading.Thread ):
         self.__lastTime = time.time()
         self.log = logging.getLogger( 'collector' )
         self.log.setLevel( logging.DEBUG )
+        cfg = self.__cfgClass.Configuration.get( 'collector', {} )
+        self.__initializer = ParallelInitializer( 'collector', workers = cfg.get( 'init_workers', 8 ),
+                                                  timeout = cfg.get( 'init_timeout', 30 ),
+                                                  retry = cfg.get( 'init_retry', 60 ) )
         self.__updateConfiguration()
         return
 
     def __updateConfiguration(self):
         self.__cfgIndex += 1
         cfg = self.__cfgClass.Configuration.get( 'collector', {} )
+        factories = {}
         for forward in cfg.get( 'forward', [] ):
             for mod_name in cfg.get( 'modules', [] ):
                 if not mod_name.endswith( forward ):
                     continue
 
-                try:
-                    self.log.info( f'Loading module: {mod_name}')
-                    mod = importlib.import_module( f"sysinvest.{mod_name}" )
-                    _class = getattr( mod, getattr( mod, 'REPORT_CLASS' ) )
-                    collector = _class( cfg )
-                    collector.ConfigIndex = self.__cfgIndex
-                    collector.ConfigDateTime = datetime.now()
-                    self.__classes.append( collector )
+                factories[ mod_name ] = partial( self.__create, mod_name, cfg )
 
-                except Exception:
-                    self.log.exception( f"Probem initializing collector module: {mod_name}" )
+        # The reporters are created in parallel, the slow ones are added when ready
+        for mod_name, collector in self.__initializer.create( factories ):
+            self.__adopt( collector )
+
+        return
+
+    def __create( self, mod_name: str, cfg: dict ):
+        self.log.info( f'Loading module: {mod_name}')
+        mod = importlib.import_module( f"sysinvest.{mod_name}" )
+        _class = getattr( mod, getattr( mod, 'REPORT_CLASS' ) )
+        return _class( cfg )
+
+    def __adopt( self, collector ) -> None:
+        collector.ConfigIndex = self.__cfgIndex
+        collector.ConfigDateTime = datetime.now()
+        # Each reporter runs on its own thread, so a slow reporter only delays itself
+        cfg = self.__cfgClass.Configuration.get( 'collector', {} )
+        worker = ReporterWorker( collector, queue_size = cfg.get( 'queue_size', 100 ) )
+        worker.start()
+        self.__classes.append( worker )
+        return
+
+    def __created( self ) -> None:
+        """Adds the reporters that were created in the background"""
+        for mod_name, collector in self.__initializer.poll():
+            self.log.info( f'Loaded module: {mod_name}' )
+            self.__adopt( collector )
 
         return
 
@@ -101,46 +128,129 @@ class Collector( threading.Thread ):
     def stop( self ):
         self.log.warning(f"Stopping the collector")
         self.__stop.set()
+        API.QUEUE.interrupt()
         return
 
+    def __timeUntilPublish( self ) -> float:
+        """Seconds until the time threshold is reached, at most a minute
+        so the reporters created in the background are picked up"""
+        thresholds = self.__cfgClass.Configuration.get( 'collector', {} ).get( 'thresholds', {} )
+        remaining = self.__lastTime + thresholds.get( 'time', 60 ) - time.time()
+        return max( 0.1, min( remaining, 60 ) )
+
+    def __drain( self, first ) -> list:
+        """The first item with the items queued meanwhile, up to 'max_batch' items"""
+        maxBatch = self.__cfgClass.Configuration.get( 'collector', {} ).get( 'max_batch', 1000 )
+        items = [ first ]
+        while len( items ) < maxBatch:
+            try:
+                items.append( API.QUEUE.get_nowait() )
+
+            except _queue.Empty:
+                break
+
+        return items
+
     def run( self ):
         while not self.__stop.is_set():
-            self.log.warning(f"Idle collector")
+            self.__created()
             try:
-                item = API.QUEUE.get_nowait()
-                self.log.info( f"Dequeue: {item}"  )
-                self.notify( item )
-                API.QUEUE.task_done()
+                # Blocks until a result arrives, the priority results come first
+                items = self.__drain( API.QUEUE.get( timeout = self.__timeUntilPublish() ) )
+                self.log.info( f"Dequeue: {len( items )} items" )
+                try:
+                    self.notifyBatch( items )
+
+                finally:
+                    for _ in items:
+                        API.QUEUE.task_done()
 
             except _queue.Empty:
-                pass
+                self.log.debug( f"Idle collector" )
 
             except Exception as exc:
                 self.log.exception( f"Exception: {exc}" )
 
-            if API.QUEUE.qsize() > 0:
-                self.log.info( f"Queue items: {API.QUEUE.qsize()}" )
-                continue
+            try:
+                self.publish()
+
+            except Exception as exc:
+                self.log.exception( f"Exception: {exc}" )
 
-            self.__stop.wait( 5 )
+        self.__initializer.stop()
+        for _class in self.__classes:
+            _class.stop()
 
         self.log.warning(f"Stopped collector")
         return
 
-    def notify( self, event: PluginResult ):
-        self.log.info( f"notify: {event}" )
-        if not event.Result and not event.Plugin.Priority:
-            # Count the failed messages
-            self.__messageCount += 1
+    def notify( self, event: Union[ PluginResult, PluginResultBatch ] ):
+        self.notifyBatch( [ event ] )
+        return
+
+    def notifyBatch( self, events: List[ Union[ PluginResult, PluginResultBatch ] ] ):
+        """Notifies the reporters of the results at once, the reporters publish once
+        when there is a priority result among them"""
+        results = []
+        for event in events:
+            results.extend( event.Results if isinstance( event, PluginResultBatch ) else [ event ] )
+
+        priority = False
+        for result in results:
+            if result.Plugin.Priority:
+                priority = True
+
+            elif not result.Result:
+                # Count the failed messages
+                self.__messageCount += 1
 
         for _class in self.__classes:
-            self.log.info( f"notify: {_class}" )
-            _class.notify( event )
-            if event.Plugin.Priority:
+            self.log.info( f"notify: {_class.Reporter.Name} {len( results )} results" )
+            _class.notifyBatch( results )
+            if priority:
                 _class.publish()
 
         return
 
+    def flush( self, timeout: Optional[float] = 60 ):
+        """Notifies the reporters of all queued results and publishes, regardless of the thresholds,
+        and waits up to 'timeout' seconds per reporter until they are done"""
+        self.__created()
+        while True:
+            try:
+                items = self.__drain( API.QUEUE.get_nowait() )
+
+            except _queue.Empty:
+                break
+
+            try:
+                self.notifyBatch( items )
+
+            except Exception as exc:
+                self.log.exception( f"Exception: {exc}" )
+
+            for _ in items:
+                API.QUEUE.task_done()
+
+        for _class in self.__classes:
+            _class.publish()
+
+        for _class in self.__classes:
+            if not _class.wait( timeout ):
+                self.log.error( f"Reporter {_class.Reporter.Name} did not finish within {timeout} seconds" )
+
+        self.__lastTime = time.time()
+        self.__messageCount = 0
+        return
+
+    def info( self ) -> dict:
+        """The counters of the result queue, and the queue depth, errors, dropped results
+        and lag per reporter"""
+        return {
+            'queue':        API.QUEUE.info(),
+            'reporters':    { _class.Reporter.Name: _class.info() for _class in self.__classes }
+        }
+
     def publish( self ):
         # For publishing we need to check the threshold values
         doPublish = False
@@ -46,7 +46,12 @@ class ConfigLoader( Thread ):
                 else:
                     print( "Loading configuration" )
 
-                self.reload()
+                try:
+                    self.reload()
+
+                except Exception:
+                    self.log.exception( "Reloading configuration failed, keeping the current configuration" )
+                    self.__lastTimeStamp = currentTimeStamp
 
             # Her we wait for a minute of when the event is set
             self.__event.wait( 10 )
@@ -54,20 +59,28 @@ class ConfigLoader( Thread ):
         return
 
     def reload(self):
+        """Loads the configuration files into a new configuration, which replaces
+        the current configuration at once. On an error the current configuration
+        is kept.
+        """
         self.__loading = True
-        self.__updateIndex += 1
-        self.load( self.__masterConfig )
-        log_cfg = self.__configuration.get( 'logging' )
-        if isinstance( log_cfg, dict ):
-            logging.config.dictConfig( log_cfg )
-
+        updateIndex = self.__updateIndex + 1
+        configuration = {}
+        self.load( self.__masterConfig, configuration, updateIndex )
         for configFile in self.__optionConfig:
             if os.path.exists( configFile ):
-                self.load( configFile )
+                self.load( configFile, configuration, updateIndex )
 
             else:
                 raise FileNotFoundError( f"Could not load { configFile }" )
 
+        configuration.setdefault( 'objects', [] )
+        self.__configuration = configuration
+        self.__updateIndex = updateIndex
+        log_cfg = self.__configuration.get( 'logging' )
+        if isinstance( log_cfg, dict ):
+            logging.config.dictConfig( log_cfg )
+
         self.__loading = False
         return
 
@@ -75,7 +88,12 @@ class ConfigLoader( Thread ):
     def isLoading(self):
         return self.__loading
 
-    def __updateObjects(self, items, master_config):
+    @property
+    def UpdateIndex( self ) -> int:
+        """Incremented on every (re)load of the configuration"""
+        return self.__updateIndex
+
+    def __updateObjects(self, items, master_config, update_index: int ):
         for item in items:
             found = False
             for master in master_config:
@@ -84,18 +102,16 @@ class ConfigLoader( Thread ):
                     for ikey, ivalue in item.items():
                         master[ ikey ] = ivalue
 
-                    master[ 'index' ] = self.__updateIndex
-                    master[ 'update_dt' ] = datetime.now()
-
             if not found:
-                item[ 'index' ] = self.__updateIndex
-                item[ 'update_dt' ] = datetime.now()
-                master_config.append(copy.copy(item))
+                master_config.append( copy.copy( item ) )
 
+        for master in master_config:
+            master[ 'index' ] = update_index
+            master[ 'update_dt' ] = datetime.now()
 
         return
 
-    def load(self, config_file: str):
+    def load(self, config_file: str, configuration: dict, update_index: int ):
         if self.log.hasHandlers():
             self.log.info( f"Loading configuration: {config_file}" )
 
@@ -112,25 +128,16 @@ class ConfigLoader( Thread ):
             # Copy the configuration
             for key, value in config.items():
                 if key == 'objects':
-                    if key in self.__configuration:
-                        # This is the list with actions
-                        self.__updateObjects( value, self.__configuration[ key ] )
-
-                    else:
-                        for item in value:
-                            self.__configuration.setdefault( key, [] ).append( copy.copy( item ) )
+                    # This is the list with actions, objects with the same name are merged
+                    self.__updateObjects( value, configuration.setdefault( key, [] ), update_index )
 
                 else:
-                    self.__configuration[ key ] = value
+                    configuration[ key ] = value
 
-            self.__configuration[ 'index' ]     = self.__updateIndex
-            self.__configuration[ 'update_dt' ] = datetime.now()
+            configuration[ 'index' ]     = update_index
+            configuration[ 'update_dt' ] = datetime.now()
 
         self.__lastTimeStamp = currentTimeStamp
-        for item in self.__configuration[ 'objects' ]:
-            if item.get( 'index', 0 ) < self.__updateIndex:
-                item[ 'enabled' ] = False
-
         return
 
     @property
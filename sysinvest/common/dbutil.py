@@ -62,6 +62,13 @@ class SqlMonitorPlugin( MonitorPlugin ):
     def Dsn(self):
         return self.__dsn
 
+    def defaultConcurrencyKey( self ):
+        url = self.Attributes.get( 'url' )
+        if isinstance( url, str ):
+            return urlparse( url ).hostname
+
+        return self.Attributes.get( 'host', self.Attributes.get( 'dsn' ) )
+
     def getDatabaseConfig( self ):
         url = self.Attributes.get('url')
         if isinstance( url, str ):
@@ -0,0 +1,106 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import List, Dict, Iterable
+import logging
+from sysinvest.common.plugin import MonitorPlugin
+
+
+class DependencyGraph( object ):
+    """The 'depends_on' relations between the monitor tasks.
+
+    The tasks are ranked in topological order (Kahn's algorithm), a task always
+    has a higher rank than the tasks it depends on. Tasks in a dependency cycle
+    are reported and get the highest rank, their dependencies are still checked.
+    """
+    def __init__( self, tasks: Iterable[ MonitorPlugin ] ):
+        self.log        = logging.getLogger( 'monitor' )
+        self.__tasks    = { task.Name: task for task in tasks }
+        self.__parents  = {}
+        self.__ranks    = {}
+        for name, task in self.__tasks.items():
+            parents = []
+            for parent in task.DependsOn:
+                if parent not in self.__tasks:
+                    self.log.error( f"{name} depends on unknown object '{parent}'" )
+                    continue
+
+                parents.append( self.__tasks[ parent ] )
+
+            self.__parents[ name ] = parents
+
+        self.__rank()
+        return
+
+    def __rank( self ) -> None:
+        incoming = { name: len( parents ) for name, parents in self.__parents.items() }
+        children = { name: [] for name in self.__tasks }
+        for name, parents in self.__parents.items():
+            for parent in parents:
+                children[ parent.Name ].append( name )
+
+        current = [ name for name, count in incoming.items() if count == 0 ]
+        rank = 0
+        while len( current ) > 0:
+            following = []
+            for name in current:
+                self.__ranks[ name ] = rank
+                for child in children[ name ]:
+                    incoming[ child ] -= 1
+                    if incoming[ child ] == 0:
+                        following.append( child )
+
+            current = following
+            rank += 1
+
+        cycle = [ name for name in self.__tasks if name not in self.__ranks ]
+        if len( cycle ) > 0:
+            self.log.error( f"Dependency cycle between: {', '.join( cycle )}" )
+            for name in cycle:
+                self.__ranks[ name ] = rank
+
+        return
+
+    def rank( self, task: MonitorPlugin ) -> int:
+        return self.__ranks.get( task.Name, 0 )
+
+    def parents( self, task: MonitorPlugin ) -> List[ MonitorPlugin ]:
+        return self.__parents.get( task.Name, [] )
+
+    def sort( self, tasks: List[ MonitorPlugin ] ) -> List[ MonitorPlugin ]:
+        """The tasks in topological order"""
+        return sorted( tasks, key = self.rank )
+
+    def failing( self, task: MonitorPlugin ) -> Dict[ str, MonitorPlugin ]:
+        """The failing upstream tasks of the task, including the ancestors of its parents"""
+        result = {}
+        visited = set()
+        pending = list( self.parents( task ) )
+        while len( pending ) > 0:
+            parent = pending.pop()
+            if parent.Name in visited:
+                continue
+
+            visited.add( parent.Name )
+            if parent.LastResult is False:
+                result[ parent.Name ] = parent
+
+            pending.extend( self.parents( parent ) )
+
+        return result
@@ -0,0 +1,373 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import List, Tuple, Optional, Coroutine
+import time
+import asyncio
+import logging
+from collections import deque
+from threading import Event, Thread
+from concurrent.futures import ThreadPoolExecutor, Future
+from sysinvest.common.plugin import MonitorPlugin, PluginResult
+from sysinvest.common.isolation import ProcessPool
+import sysinvest.common.api as API
+
+
+class EventLoopThread( Thread ):
+    """The event loop shared by all asynchronous monitor plugins"""
+    def __init__( self ):
+        super().__init__( name = 'asyncio', daemon = True )
+        self.__loop = asyncio.new_event_loop()
+        return
+
+    @property
+    def Loop( self ) -> asyncio.AbstractEventLoop:
+        return self.__loop
+
+    def run( self ) -> None:
+        asyncio.set_event_loop( self.__loop )
+        try:
+            self.__loop.run_forever()
+
+        finally:
+            # Cancel the tasks still running and let them finish their cancellation
+            pending = asyncio.all_tasks( self.__loop )
+            for task in pending:
+                task.cancel()
+
+            self.__loop.run_until_complete( asyncio.gather( *pending, return_exceptions = True ) )
+            self.__loop.close()
+
+        return
+
+    def submit( self, coroutine: Coroutine ) -> Future:
+        return asyncio.run_coroutine_threadsafe( coroutine, self.__loop )
+
+    def stop( self ) -> None:
+        self.__loop.call_soon_threadsafe( self.__loop.stop )
+        return
+
+
+OVERRUN_SKIP        = 'skip'
+OVERRUN_QUEUE_ONE   = 'queue-one'
+OVERRUN_PARALLEL    = 'allow-parallel'
+
+
+class RunningTask( object ):
+    def __init__( self, task: MonitorPlugin, key: Optional[str] = None ):
+        self.task       = task
+        self.key        = key
+        # Set when a worker starts the run, the time waiting for a worker does not count
+        self.started    = None
+        self.timedOut   = False
+        return
+
+
+class TaskExecutor( object ):
+    """Runs the due monitor tasks on a pool of worker threads.
+
+    Plugins with an 'async def execute()' run on the shared event loop, when
+    no loop is given they run with their own loop on a worker thread. Plugins
+    configured with 'isolation: process' are executed in a worker process.
+    The executor is driven by the monitor thread, poll() collects the finished
+    tasks and reports the tasks that exceed their timeout.
+
+    When a task is still running at its next fire, its 'overrun' policy decides:
+    'skip' (default) drops the run, 'queue-one' starts one run as soon as the
+    running one finishes and 'allow-parallel' starts the run anyway. A timed out
+    task that is still running counts as running.
+    """
+    def __init__( self, max_workers: int = 8, timeout: int = 300, wakeup: Optional[Event] = None,
+                  loop: Optional[EventLoopThread] = None, isolation: Optional[dict] = None,
+                  concurrency_limit: int = 4 ):
+        self.log            = logging.getLogger( 'monitor' )
+        self.__maxWorkers   = max_workers
+        self.__timeout      = timeout
+        self.__wakeup       = wakeup
+        self.__loop         = loop
+        self.__isolation    = isolation or {}
+        self.__processPool  = None
+        self.__running      = {}
+        self.__active       = {}
+        self.__queued       = set()
+        self.__concurrencyLimit = concurrency_limit
+        self.__keys         = {}
+        self.__gated        = {}
+        self.__gatedTasks   = set()
+        self.__pool         = ThreadPoolExecutor( max_workers = max_workers, thread_name_prefix = 'task' )
+        return
+
+    @property
+    def MaxWorkers( self ) -> int:
+        return self.__maxWorkers
+
+    @property
+    def Running( self ) -> int:
+        """The running tasks, including the tasks waiting for their concurrency key"""
+        return len( [ running for running in list( self.__running.values() ) if not running.timedOut ] ) + \
+               sum( len( gated ) for gated in list( self.__gated.values() ) )
+
+    @property
+    def Abandoned( self ) -> int:
+        """The timed out runs that are still running"""
+        return len( [ running for running in list( self.__running.values() ) if running.timedOut ] )
+
+    @property
+    def AbandonedThreads( self ) -> int:
+        """The worker threads held by timed out runs, these are not available for other tasks.
+
+        Read from any thread, by Monitor.info(), while the monitor thread updates the runs.
+        """
+        return len( [ running for running in list( self.__running.values() )
+                      if running.timedOut and ( not running.task.IsAsync or self.__loop is None ) ] )
+
+    def isActive( self, task: MonitorPlugin ) -> bool:
+        return self.__active.get( task, 0 ) > 0 or task in self.__gatedTasks
+
+    def isRunning( self, task: MonitorPlugin ) -> bool:
+        """True when the task runs or is queued to run, abandoned runs do not count"""
+        return task in self.__queued or task in self.__gatedTasks or any( running.task is task and not running.timedOut
+                                             for running in self.__running.values() )
+
+    def timeout( self, task: MonitorPlugin ) -> float:
+        timeout = task.Timeout
+        return timeout if isinstance( timeout, ( int, float ) ) and timeout > 0 else self.__timeout
+
+    def deadline( self, task: MonitorPlugin ) -> float:
+        timeout = self.timeout( task )
+        if task.Isolation == 'process':
+            # The process pool kills the task itself, it may have to wait for a free worker first
+            return ( 2 * timeout ) + 5
+
+        return timeout
+
+    def forget( self, task: MonitorPlugin ) -> None:
+        """Drops the queued run of a removed task, a running execution is left to finish"""
+        self.__queued.discard( task )
+        if task in self.__gatedTasks:
+            self.__gatedTasks.discard( task )
+            for gated in self.__gated.values():
+                while task in gated:
+                    gated.remove( task )
+
+        return
+
+    def submit( self, task: MonitorPlugin ) -> bool:
+        """Starts the task, returns False when the task is not started because of its overrun policy"""
+        if self.isActive( task ):
+            policy = task.Overrun
+            if policy == OVERRUN_QUEUE_ONE:
+                if task in self.__queued:
+                    task.countCoalesced()
+                    self.log.warning( f"{task.Name} is still running, run coalesced with the queued run" )
+
+                else:
+                    self.__queued.add( task )
+                    self.log.warning( f"{task.Name} is still running, run queued" )
+
+                return False
+
+            elif policy != OVERRUN_PARALLEL:
+                task.countSkipped()
+                self.log.warning( f"{task.Name} is still running, run skipped" )
+                return False
+
+        self.__start( task )
+        return True
+
+    def __start( self, task: MonitorPlugin ) -> None:
+        key = task.ConcurrencyKey
+        if key is not None:
+            limit = task.ConcurrencyLimit or self.__concurrencyLimit
+            if self.__keys.get( key, 0 ) >= limit:
+                # Wait without occupying a worker thread until a task with the same key finishes
+                self.__gated.setdefault( key, deque() ).append( task )
+                self.__gatedTasks.add( task )
+                self.log.info( f"{task.Name} waiting, {limit} tasks on '{key}' are running" )
+                return
+
+            self.__keys[ key ] = self.__keys.get( key, 0 ) + 1
+
+        running = RunningTask( task, key )
+        if task.Isolation == 'process':
+            if self.__processPool is None:
+                self.__processPool = ProcessPool( processes = self.__isolation.get( 'processes', 2 ),
+                                                  max_runs = self.__isolation.get( 'max_runs', 100 ) )
+
+            future = self.__pool.submit( self.__executeIsolated, running )
+
+        elif task.IsAsync and self.__loop is not None:
+            future = self.__loop.submit( self.__executeAsync( running ) )
+
+        else:
+            future = self.__pool.submit( self.__execute, running )
+
+        self.__running[ future ] = running
+        self.__active[ task ] = self.__active.get( task, 0 ) + 1
+        future.add_done_callback( self.__done )
+        return
+
+    def __done( self, future: Future ) -> None:
+        if self.__wakeup is not None:
+            self.__wakeup.set()
+
+        return
+
+    def __begin( self, running: RunningTask ) -> float:
+        """Called by the worker, the timeout of the run starts now"""
+        running.started = time.monotonic()
+        if self.__wakeup is not None:
+            # Let the monitor take the new deadline into account
+            self.__wakeup.set()
+
+        return running.started
+
+    def __execute( self, running: RunningTask ) -> Tuple[ bool, float, Optional[float] ]:
+        task = running.task
+        self.log.info( f"{task.Name} is being started" )
+        started = self.__begin( running )
+        cpu = time.thread_time()
+        if task.IsAsync:
+            result = asyncio.run( task.execute() )
+
+        else:
+            result = task.execute()
+
+        if result:
+            task.resetHits()
+
+        self.log.info( f"{task.Name} is finished" )
+        return result, time.monotonic() - started, time.thread_time() - cpu
+
+    def __executeIsolated( self, running: RunningTask ) -> Tuple[ bool, float, Optional[float] ]:
+        task = running.task
+        self.log.info( f"{task.Name} is being started in an isolation worker" )
+        started = self.__begin( running )
+        # The bookkeeping of the plugin in this process
+        MonitorPlugin.execute( task )
+        result, cpu = self.__processPool.execute( task, self.timeout( task ) )
+        if result:
+            task.resetHits()
+
+        self.log.info( f"{task.Name} is finished" )
+        return result, time.monotonic() - started, cpu
+
+    async def __executeAsync( self, running: RunningTask ) -> Tuple[ bool, float, Optional[float] ]:
+        task = running.task
+        self.log.info( f"{task.Name} is being started" )
+        started = self.__begin( running )
+        result = await task.execute()
+        if result:
+            task.resetHits()
+
+        self.log.info( f"{task.Name} is finished" )
+        # The CPU time of a coroutine cannot be told apart from the other coroutines on the loop
+        return result, time.monotonic() - started, None
+
+    def nextTimeout( self ) -> Optional[float]:
+        """Seconds until the first running task exceeds its timeout"""
+        now = time.monotonic()
+        remaining = [ running.started + self.deadline( running.task ) - now
+                      for running in list( self.__running.values() )
+                      if not running.timedOut and running.started is not None ]
+        return max( 0, min( remaining ) ) if len( remaining ) > 0 else None
+
+    def __release( self, running: RunningTask ) -> None:
+        """Releases the concurrency key of the run and starts the first task waiting for it"""
+        key, running.key = running.key, None
+        if key is None:
+            return
+
+        self.__keys[ key ] -= 1
+        if self.__keys[ key ] == 0:
+            del self.__keys[ key ]
+
+        gated = self.__gated.get( key )
+        if gated:
+            task = gated.popleft()
+            if len( gated ) == 0:
+                del self.__gated[ key ]
+
+            if task not in [ waiting for queue in self.__gated.values() for waiting in queue ]:
+                self.__gatedTasks.discard( task )
+
+            self.__start( task )
+
+        return
+
+    def __finished( self, task: MonitorPlugin ) -> None:
+        self.__active[ task ] -= 1
+        if self.__active[ task ] > 0:
+            return
+
+        del self.__active[ task ]
+        if task in self.__queued:
+            self.__queued.discard( task )
+            self.log.info( f"{task.Name} starting the queued run" )
+            self.__start( task )
+
+        return
+
+    def poll( self ) -> List[ Tuple[ MonitorPlugin, bool ] ]:
+        finished = []
+        now = time.monotonic()
+        for future, running in list( self.__running.items() ):
+            task = running.task
+            if future.done():
+                del self.__running[ future ]
+                self.__release( running )
+                if not running.timedOut:
+                    try:
+                        result, wall, cpu = future.result()
+
+                    except Exception:
+                        self.log.exception( f"During execution of {task.Name}" )
+                        result, wall, cpu = False, now - ( running.started or now ), None
+
+                    task.Statistics.record( wall, cpu, bool( result ) )
+                    finished.append( ( task, result ) )
+
+                self.__finished( task )
+
+            elif not running.timedOut and running.started is not None and now - running.started >= self.deadline( task ):
+                # An asynchronous task is cancelled, a worker thread cannot be interrupted,
+                # it is abandoned and its result (when it ever finishes) is ignored.
+                running.timedOut = True
+                future.cancel()
+                # The abandoned run does not hold on to its key, the next task may start
+                self.__release( running )
+                timeout = self.deadline( task )
+                task.Statistics.record( now - running.started, None, False, timeout = True )
+                self.log.error( f"{task.Name} did not finish within {timeout} seconds" )
+                task_result = PluginResult( task )
+                task_result.update( False, f"Task did not finish within {timeout} seconds", timeout = timeout )
+                API.QUEUE.put( task_result )
+                finished.append( ( task, False ) )
+                if not task.IsAsync or self.__loop is None:
+                    self.log.warning( f"{self.AbandonedThreads} of {self.__maxWorkers} worker threads "
+                                      f"are held by abandoned runs" )
+
+        return finished
+
+    def shutdown( self ) -> None:
+        self.__pool.shutdown( wait = False )
+        if self.__processPool is not None:
+            self.__processPool.shutdown()
+
+        return
@@ -0,0 +1,228 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import Any, Callable, FrozenSet, List, Optional, Tuple, Union
+import os
+import re
+import ast
+import json
+import logging
+import builtins
+from functools import lru_cache
+from collections import ChainMap
+import yaml
+from sysinvest.common.plugin.result import compileTemplate
+
+
+C_FOREACH               = 'foreach'
+C_FOREACH_ITEM          = 'foreach_item'
+C_FOREACH_FINGERPRINT   = 'foreach_fingerprint'
+# The result templates are rendered with the result, these are shared as they are
+SHARED                  = ( 'name', C_FOREACH, 'template', 'template_file' )
+
+log = logging.getLogger( 'monitor' )
+_files = {}
+
+
+def loadTargets( foreach: Union[list, dict, str] ) -> Tuple[ list, Any ]:
+    """The targets of a 'foreach' with their version, a list or a YAML file with a list,
+    given as 'file: name' or as the file name. The files are cached until they are modified."""
+    if isinstance( foreach, list ):
+        return foreach, None
+
+    filename = foreach.get( 'file' ) if isinstance( foreach, dict ) else foreach
+    mtime = os.stat( filename ).st_mtime
+    cached = _files.get( filename )
+    if cached is None or cached[ 0 ] != mtime:
+        with open( filename, 'r' ) as stream:
+            targets = yaml.load( stream, Loader = yaml.Loader ) or []
+
+        cached = _files[ filename ] = ( mtime, targets )
+
+    return cached[ 1 ], cached[ 0 ]
+
+
+@lru_cache( maxsize = 1024 )
+def isTargetExpression( expression: str, names: FrozenSet[str] ) -> bool:
+    """True when the expression uses the target variables and otherwise only builtins.
+    Other expressions, like '${uuid.uuid4()}' or a query '${id}', are rendered later
+    by the plugin with its own variables."""
+    # Without the Mako filters, like '${host | h}'
+    filters = re.match( r'^(.*?)\|\s*\w+(\s*,\s*\w+)*\s*$', expression, re.S )
+    if filters is not None:
+        expression = filters.group( 1 )
+
+    try:
+        tree = ast.parse( expression.strip(), mode = 'eval' )
+
+    except SyntaxError:
+        return False
+
+    used = { node.id for node in ast.walk( tree ) if isinstance( node, ast.Name ) and isinstance( node.ctx, ast.Load ) }
+    bound = { node.id for node in ast.walk( tree ) if isinstance( node, ast.Name ) and isinstance( node.ctx, ast.Store ) }
+    used -= bound
+    return len( used & names ) > 0 and all( name in names or hasattr( builtins, name ) for name in used )
+
+
+def renderString( value: str, variables: dict ) -> str:
+    """Renders the '${...}' expressions of the target, the others are left as written"""
+    names = frozenset( variables )
+    parts = []
+    position = 0
+    start = value.find( '${' )
+    while start >= 0:
+        depth = 0
+        end = start + 1
+        while end < len( value ):
+            if value[ end ] == '{':
+                depth += 1
+
+            elif value[ end ] == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+
+            end += 1
+
+        if end >= len( value ):
+            # Not terminated, left as written
+            break
+
+        expression = value[ start + 2: end ]
+        if isTargetExpression( expression, names ):
+            parts.append( value[ position: start ] )
+            parts.append( compileTemplate( value[ start: end + 1 ] ).render( **variables ) )
+            position = end + 1
+
+        start = value.find( '${', end + 1 )
+
+    if position == 0:
+        return value
+
+    parts.append( value[ position: ] )
+    return ''.join( parts )
+
+
+def render( value: Any, variables: dict ) -> Any:
+    """Renders the target expressions in the strings of the value. The parts without
+    these are not copied, these are shared by all targets."""
+    if isinstance( value, str ):
+        if '${' not in value:
+            return value
+
+        return renderString( value, variables )
+
+    elif isinstance( value, dict ):
+        rendered = { key: render( item, variables ) for key, item in value.items() }
+        if all( rendered[ key ] is item for key, item in value.items() ):
+            return value
+
+        return rendered
+
+    elif isinstance( value, list ):
+        rendered = [ render( item, variables ) for item in value ]
+        if all( new is old for new, old in zip( rendered, value ) ):
+            return value
+
+        return rendered
+
+    return value
+
+
+def expand( definition: dict, targets: list, fingerprint: str = '' ) -> List[ ChainMap ]:
+    """Expands an object with 'foreach' into a virtual object per target.
+
+    A virtual object is a ChainMap of the rendered name and settings on top of the
+    definition, the settings without templates and the result template are shared.
+    Only the expressions of the target variables are rendered, the templates that
+    the plugins render themselves, like a query with '${id}', are left as written.
+    A target is a dictionary with the variables for the templates, or a single value
+    available as 'item'.
+    """
+    objects = []
+    names = set()
+    name = definition.get( 'name', 'unknown' )
+    for index, target in enumerate( targets ):
+        variables = dict( target ) if isinstance( target, dict ) else { 'item': target }
+        variables.setdefault( 'index', index )
+        if '${' in name:
+            targetName = render( name, variables )
+
+        else:
+            targetName = f"{name} {index if isinstance( target, dict ) else target}"
+
+        if targetName in names:
+            log.error( f"Object {name}: target {targetName} is not unique, ignored" )
+            continue
+
+        names.add( targetName )
+        overrides = {
+            'name':                 targetName,
+            C_FOREACH_ITEM:         variables,
+            C_FOREACH_FINGERPRINT:  fingerprint + json.dumps( variables, sort_keys = True, default = str ),
+        }
+        for key, value in definition.items():
+            if key not in SHARED:
+                rendered = render( value, variables )
+                if rendered is not value:
+                    overrides[ key ] = rendered
+
+        objects.append( ChainMap( overrides, definition ) )
+
+    return objects
+
+
+class FanOut( object ):
+    """Expands the 'foreach' definitions of the objects, the expansion of a definition
+    is kept while the definition and its targets are not changed. Therefore the cost
+    of a reload scales with the number of definitions and not with the targets."""
+    def __init__( self, fingerprint: Optional[ Callable[ [dict], str ] ] = None ):
+        self.__fingerprint  = fingerprint or ( lambda obj: json.dumps( obj, sort_keys = True, default = str ) )
+        self.__expansions   = {}
+        return
+
+    def expand( self, objects: List[ dict ] ) -> List[ Union[ dict, ChainMap ] ]:
+        result = []
+        expansions = {}
+        for definition in objects:
+            foreach = definition.get( C_FOREACH )
+            if foreach is None:
+                result.append( definition )
+                continue
+
+            try:
+                targets, version = loadTargets( foreach )
+                # The targets are identified by the definition without the target list,
+                # so a change of the list leaves the other targets unchanged
+                common = self.__fingerprint( { key: value for key, value in definition.items() if key != C_FOREACH } )
+                key = ( common, json.dumps( foreach, sort_keys = True, default = str ), version )
+                expansion = self.__expansions.get( key )
+                if expansion is None:
+                    expansion = expand( definition, targets, common )
+
+            except Exception:
+                log.exception( f"Expanding the 'foreach' of {definition.get( 'name' )}" )
+                continue
+
+            expansions[ key ] = expansion
+            result.extend( expansion )
+
+        # Only the expansions of the current definitions are kept
+        self.__expansions = expansions
+        return result
@@ -0,0 +1,257 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import deque
+from threading import Thread, Condition, Event
+import time
+import logging
+
+
+class InitJob( object ):
+    def __init__( self, key: str, factory: Callable[ [], Any ], timeout: float ):
+        self.Key        = key
+        self.Factory    = factory
+        self.Timeout    = timeout
+        self.Started    = None
+        self.Done       = False
+        self.Instance   = None
+        self.Attempts   = 0
+        self.RetryAt    = None
+        return
+
+
+class ParallelInitializer( object ):
+    """Creates plugins in parallel on a small pool of daemon threads.
+
+    create() waits until each plugin is created, failed or its timeout passed, so
+    the startup takes about as long as the slowest creation. submit() does not wait,
+    the plugins are all created in the background. A creation that failed
+    is retried every 'retry' seconds and a creation that timed out is left to
+    finish; poll() returns the plugins created since, on the thread of the caller.
+    A thread hanging in a creation is not counted against 'workers', so the queued
+    creations still get a thread. The 'wakeup' event is set when a plugin is created.
+    """
+    def __init__( self, name: str, workers: int = 8, timeout: float = 30.0, retry: float = 60.0,
+                  discard: Optional[Callable[ [Any], None ]] = None, wakeup: Optional[Event] = None ):
+        self.log        = logging.getLogger( name )
+        self.__name     = name
+        self.__timeout  = timeout
+        self.__retry    = retry
+        self.__discard  = discard
+        self.__wakeup   = wakeup
+        self.__cond     = Condition()
+        self.__queue    = deque()
+        self.__jobs     = {}
+        self.__threads  = []
+        self.__workers  = workers
+        self.__busy     = 0
+        self.__stopped  = False
+        return
+
+    @property
+    def Pending( self ) -> List[ str ]:
+        """The keys of the plugins that are not created yet"""
+        with self.__cond:
+            return list( self.__jobs )
+
+    def isPending( self, key: str ) -> bool:
+        with self.__cond:
+            return key in self.__jobs
+
+    def __submit( self, job: InitJob ) -> None:
+        # Called with the condition held
+        job.Started = None
+        job.RetryAt = None
+        self.__queue.append( job )
+        self.__grow()
+        self.__cond.notify_all()
+        return
+
+    def __grow( self ) -> None:
+        # Called with the condition held, starts a thread for the queued jobs when there
+        # is no idle thread, the threads hanging past the timeout of their job do not count
+        now = time.monotonic()
+        hanging = sum( 1 for job in self.__jobs.values()
+                       if job.Started is not None and not job.Done and now - job.Started >= job.Timeout )
+        if len( self.__threads ) - hanging < self.__workers and len( self.__queue ) > len( self.__threads ) - self.__busy:
+            thread = Thread( target = self.__worker, name = f"{self.__name}-init-{len( self.__threads )}", daemon = True )
+            self.__threads.append( thread )
+            thread.start()
+
+        return
+
+    def __worker( self ) -> None:
+        while True:
+            with self.__cond:
+                while len( self.__queue ) == 0 and not self.__stopped:
+                    self.__cond.wait()
+
+                if self.__stopped:
+                    return
+
+                job = self.__queue.popleft()
+                self.__busy += 1
+                job.Started = time.monotonic()
+                job.Attempts += 1
+
+            instance = None
+            try:
+                instance = job.Factory()
+
+            except ModuleNotFoundError as exc:
+                self.log.error( f"Could not create {job.Key}: {exc}" )
+
+            except Exception:
+                self.log.exception( f"Creating {job.Key}" )
+
+            with self.__cond:
+                self.__busy -= 1
+                duration = time.monotonic() - job.Started
+                if self.__jobs.get( job.Key ) is not job:
+                    # Cancelled meanwhile
+                    self.__drop( instance )
+
+                elif instance is None:
+                    job.Started = None
+                    job.RetryAt = time.monotonic() + self.__retry
+
+                else:
+                    if duration >= job.Timeout:
+                        self.log.warning( f"Created {job.Key} after {duration:.1f} seconds" )
+
+                    job.Instance = instance
+                    job.Done = True
+                    if self.__wakeup is not None:
+                        # Let the owner pick it up with poll()
+                        self.__wakeup.set()
+
+                self.__cond.notify_all()
+
+        return
+
+    def __drop( self, instance: Any ) -> None:
+        if instance is not None and self.__discard is not None:
+            try:
+                self.__discard( instance )
+
+            except Exception:
+                self.log.exception( "Discarding a cancelled plugin" )
+
+        return
+
+    def __add( self, factories: Dict[ str, Callable[ [], Any ] ],
+               timeouts: Optional[ Dict[ str, float ] ] ) -> List[ InitJob ]:
+        # Called with the condition held
+        timeouts = timeouts or {}
+        jobs = []
+        for key, factory in factories.items():
+            job = InitJob( key, factory, timeouts.get( key ) or self.__timeout )
+            self.__jobs[ key ] = job
+            jobs.append( job )
+            self.__submit( job )
+
+        return jobs
+
+    def submit( self, factories: Dict[ str, Callable[ [], Any ] ],
+                timeouts: Optional[ Dict[ str, float ] ] = None ) -> None:
+        """Creates the plugins in the background, poll() returns them when created"""
+        with self.__cond:
+            self.__add( factories, timeouts )
+
+        return
+
+    def create( self, factories: Dict[ str, Callable[ [], Any ] ],
+                timeouts: Optional[ Dict[ str, float ] ] = None ) -> List[ Tuple[ str, Any ] ]:
+        """Creates the plugins in parallel, returns the ( key, plugin ) of the plugins
+        created within their timeout in the order of the factories."""
+        with self.__cond:
+            jobs = self.__add( factories, timeouts )
+
+            # The timeouts start now, a job queued behind hanging creations must not
+            # keep the startup waiting
+            since = time.monotonic()
+            while True:
+                now = time.monotonic()
+                waiting = [ job for job in jobs if not job.Done and job.RetryAt is None and now < since + job.Timeout ]
+                if len( waiting ) == 0:
+                    break
+
+                self.__grow()
+                # Wake at least every second, a started job may hang meanwhile
+                self.__cond.wait( min( 1.0, min( since + job.Timeout for job in waiting ) - now ) )
+
+            created = []
+            for job in jobs:
+                if job.Done and self.__jobs.get( job.Key ) is job:
+                    del self.__jobs[ job.Key ]
+                    created.append( ( job.Key, job.Instance ) )
+
+                elif job.RetryAt is None:
+                    self.log.warning( f"Creating {job.Key} takes longer than {job.Timeout} seconds, continuing in the background" )
+
+        return created
+
+    def poll( self ) -> List[ Tuple[ str, Any ] ]:
+        """The plugins created in the background, resubmits the failed creations that are due"""
+        created = []
+        now = time.monotonic()
+        with self.__cond:
+            if len( self.__queue ) > 0:
+                self.__grow()
+
+            for key, job in list( self.__jobs.items() ):
+                if job.Done:
+                    del self.__jobs[ key ]
+                    created.append( ( key, job.Instance ) )
+
+                elif job.RetryAt is not None and job.RetryAt <= now and not self.__stopped:
+                    self.log.info( f"Retrying to create {key}, attempt {job.Attempts + 1}" )
+                    self.__submit( job )
+
+        return created
+
+    def cancel( self, key: str ) -> None:
+        """Forgets the creation, a plugin that is still created is discarded"""
+        with self.__cond:
+            job = self.__jobs.pop( key, None )
+            if job is not None:
+                try:
+                    self.__queue.remove( job )
+
+                except ValueError:
+                    pass
+
+                if job.Done:
+                    self.__drop( job.Instance )
+
+        return
+
+    def stop( self ) -> None:
+        with self.__cond:
+            self.__stopped = True
+            self.__queue.clear()
+            for job in self.__jobs.values():
+                if job.Done:
+                    self.__drop( job.Instance )
+
+            self.__jobs.clear()
+            self.__cond.notify_all()
+
+        return
@@ -0,0 +1,273 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import List, Tuple, Optional, Union
+import time
+import pickle
+import asyncio
+import logging
+import traceback
+import multiprocessing
+from queue import Queue, Empty
+from threading import Lock, BoundedSemaphore
+from sysinvest.common.plugin import MonitorPlugin, PluginResult, PluginResultBatch
+from sysinvest.common.loader import resolvePluginClass
+import sysinvest.common.api as API
+
+
+def serializeResult( result: Union[ PluginResult, PluginResultBatch ] ) -> dict:
+    """The result as a dictionary that can be send to another process"""
+    if isinstance( result, PluginResultBatch ):
+        return { 'batch': [ dict( serializeResult( item ), key = item.Plugin.Key ) for item in result ] }
+
+    data = result.toDict()
+    details = {}
+    for key, value in data[ 'details' ].items():
+        try:
+            pickle.dumps( value )
+
+        except Exception:
+            value = str( value )
+
+        details[ key ] = value
+
+    data[ 'details' ] = details
+    return data
+
+
+def deserializeResult( task: MonitorPlugin, data: dict ) -> Union[ PluginResult, PluginResultBatch ]:
+    """The result of the task from the dictionary made by serializeResult()"""
+    if 'batch' in data:
+        result = PluginResultBatch( task )
+        for item in data[ 'batch' ]:
+            result.add( item.get( 'key' ) ).fromDict( item )
+
+        return result
+
+    result = PluginResult( task )
+    result.fromDict( data )
+    return result
+
+
+class IsolatedParent( object ):
+    """Stands in for the Monitor inside an isolation worker process"""
+    def __init__( self ):
+        self.__info = {}
+        return
+
+    @property
+    def Name( self ):
+        return "IsolatedMonitor"
+
+    @property
+    def Attributes( self ):
+        return {}
+
+    def update( self, info: dict ) -> None:
+        self.__info = info
+        return
+
+    def info( self ) -> dict:
+        return dict( self.__info )
+
+
+def _workerMain( conn ) -> None:
+    """Main loop of the worker process, executes the plugins requested by the monitor"""
+    API.QUEUE = Queue()
+    parent = IsolatedParent()
+    plugins = {}
+    while True:
+        try:
+            request = conn.recv()
+
+        except EOFError:
+            break
+
+        if request is None:
+            break
+
+        name, module, config, info = request
+        parent.update( info )
+        result = False
+        error = None
+        cpu = time.thread_time()
+        try:
+            plugin = plugins.get( name )
+            if plugin is None or plugin.Config != config:
+                if hasattr( plugin, 'stop' ):
+                    plugin.stop()
+
+                plugin = resolvePluginClass( module )( parent, config )
+                plugins[ name ] = plugin
+
+            if plugin.IsAsync:
+                result = asyncio.run( plugin.execute() )
+
+            else:
+                result = plugin.execute()
+
+        except Exception:
+            error = traceback.format_exc()
+
+        results = []
+        while True:
+            try:
+                results.append( serializeResult( API.QUEUE.get_nowait() ) )
+
+            except Empty:
+                break
+
+        conn.send( ( bool( result ), results, error, time.thread_time() - cpu ) )
+
+    for plugin in plugins.values():
+        if hasattr( plugin, 'stop' ):
+            plugin.stop()
+
+    return
+
+
+class ProcessWorker( object ):
+    """A reusable worker process for isolated plugins"""
+    def __init__( self, context ):
+        self.__conn, child = context.Pipe()
+        self.__process = context.Process( target = _workerMain, args = ( child, ), daemon = True )
+        self.__process.start()
+        child.close()
+        self.__runs = 0
+        return
+
+    @property
+    def Runs( self ) -> int:
+        return self.__runs
+
+    @property
+    def Pid( self ) -> int:
+        return self.__process.pid
+
+    def call( self, request: tuple, timeout: float ) -> tuple:
+        self.__runs += 1
+        self.__conn.send( request )
+        if not self.__conn.poll( timeout ):
+            raise TimeoutError( f"No response within {timeout} seconds" )
+
+        return self.__conn.recv()
+
+    def kill( self ) -> None:
+        self.__process.kill()
+        self.__process.join( 1 )
+        self.__conn.close()
+        return
+
+    def close( self ) -> None:
+        try:
+            self.__conn.send( None )
+
+        except OSError:
+            pass
+
+        self.__process.join( 5 )
+        if self.__process.is_alive():
+            self.__process.kill()
+
+        self.__conn.close()
+        return
+
+
+class ProcessPool( object ):
+    """Runs the plugins configured with 'isolation: process' in worker processes.
+
+    The plugin is created in the worker process from its module and configuration,
+    its results are returned as dictionaries and put on the API.QUEUE by the monitor.
+    A worker that does not respond within the timeout is killed, a worker is
+    recycled after 'max_runs' executions to cap its memory growth.
+    """
+    def __init__( self, processes: int = 2, max_runs: int = 100 ):
+        self.log            = logging.getLogger( 'monitor' )
+        self.__context      = multiprocessing.get_context( 'spawn' )
+        self.__maxRuns      = max_runs
+        self.__slots        = BoundedSemaphore( processes )
+        self.__idle: List[ProcessWorker] = []
+        self.__lock         = Lock()
+        return
+
+    def __acquire( self ) -> ProcessWorker:
+        with self.__lock:
+            if len( self.__idle ) > 0:
+                return self.__idle.pop()
+
+        return ProcessWorker( self.__context )
+
+    def __release( self, worker: ProcessWorker ) -> None:
+        if worker.Runs >= self.__maxRuns:
+            self.log.info( f"Recycling isolation worker {worker.Pid} after {worker.Runs} runs" )
+            worker.close()
+            return
+
+        with self.__lock:
+            self.__idle.append( worker )
+
+        return
+
+    def __failed( self, task: MonitorPlugin, message: str, **kwargs ) -> Tuple[ bool, Optional[float] ]:
+        self.log.error( f"{task.Name}: {message}" )
+        task_result = PluginResult( task )
+        task_result.update( False, message, **kwargs )
+        API.QUEUE.put( task_result )
+        return False, None
+
+    def execute( self, task: MonitorPlugin, timeout: float ) -> Tuple[ bool, Optional[float] ]:
+        """Executes the task in a worker process, returns the result and the CPU time used by the worker"""
+        if not self.__slots.acquire( timeout = timeout ):
+            return self.__failed( task, f"No isolation worker available within {timeout} seconds", timeout = timeout )
+
+        try:
+            worker = self.__acquire()
+            try:
+                result, results, error, cpu = worker.call( ( task.Name, task.Config.get( 'module' ), dict( task.Config ),
+                                                        task.Parent.info() ), timeout )
+
+            except TimeoutError:
+                worker.kill()
+                return self.__failed( task, f"Isolated task killed after {timeout} seconds", timeout = timeout )
+
+            except ( EOFError, OSError ) as exc:
+                worker.kill()
+                return self.__failed( task, f"Isolation worker died: {exc}" )
+
+            self.__release( worker )
+
+        finally:
+            self.__slots.release()
+
+        if error is not None:
+            self.log.error( f"{task.Name} in isolation worker:\n{error}" )
+
+        for data in results:
+            API.QUEUE.put( deserializeResult( task, data ) )
+
+        return result, cpu
+
+    def shutdown( self ) -> None:
+        with self.__lock:
+            for worker in self.__idle:
+                worker.close()
+
+            self.__idle = []
+
+        return
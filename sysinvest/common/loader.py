@@ -0,0 +1,58 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+import importlib
+from threading import Lock
+
+
+MODULE_PATHS = ( '', 'sysinvest.', 'sysinvest.monitor.' )
+
+_classes = {}
+_lock = Lock()
+
+
+def resolvePluginClass( module: str ) -> type:
+    """Returns the plugin class of a monitor module.
+
+    The module is searched as given, in the 'sysinvest' package and in the
+    'sysinvest.monitor' package. Raises ModuleNotFoundError when not found.
+    The resolved classes are cached by module name.
+    """
+    with _lock:
+        _class = _classes.get( module )
+        if _class is not None:
+            return _class
+
+        for mod_path in MODULE_PATHS:
+            mod_name = f'{mod_path}{module}'
+            try:
+                mod = importlib.import_module( mod_name )
+
+            except ModuleNotFoundError as exc:
+                if exc.name is not None and not mod_name.startswith( exc.name ):
+                    # The monitor module exists, but a package it needs is not installed
+                    raise
+
+                continue
+
+            _class = getattr( mod, getattr( mod, 'CLASS_NAME' ) )
+            _classes[ module ] = _class
+            return _class
+
+    raise ModuleNotFoundError( f"No monitor module named '{module}'" )
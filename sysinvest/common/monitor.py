@@ -17,68 +17,239 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
-import pycron
+from typing import Optional, Callable
 import psutil
 import os
+import json
 import time
 from datetime import datetime, timedelta
 import logging
-import importlib
+from functools import partial
 from threading import Event
-from sysinvest.common.plugin import MonitorPlugin
+from sysinvest.common.plugin import MonitorPlugin, PluginResult
 from sysinvest.common.watchdog import ProcessWatchdog
+from sysinvest.common.executor import TaskExecutor, EventLoopThread
+from sysinvest.common.scheduler import TaskScheduler
+from sysinvest.common.loader import resolvePluginClass
+from sysinvest.common.depends import DependencyGraph
+from sysinvest.common.fanout import FanOut, C_FOREACH_FINGERPRINT
+from sysinvest.common.initializer import ParallelInitializer
 import sysinvest.common.api as API
 from sysinvest.common.configuration import ConfigLoader
 
 
+# The estimated run time of a task that did not run yet
+DEFAULT_ESTIMATE = 1.0
+
+
 class Monitor( list ):
-    def __init__( self, config_class: ConfigLoader ):
+    def __init__( self, config_class: ConfigLoader, shard: Optional[Callable[ [str], bool ]] = None ):
         super().__init__()
         self.log            = logging.getLogger( 'monitor' )
         self.__p            = psutil.Process( os.getpid() )
         self.__event        = Event()
+        self.__wakeup       = Event()
         self.__running      = False
         self.__passes       = 0
         self.__cfgClass     = config_class
+        # In a worker process of the supervisor, only the objects of its shard are loaded
+        self.__shard        = shard
         self.__cfgIndex     = 0
+        self.__waiting      = []
+        self.__deferred     = []
+        self.__deferredRuns = 0
+        self.__shedRuns     = 0
+        self.__tickStart    = 0.0
+        self.__tickUsed     = 0.0
+        self.__fingerprints = {}
+        self.__fanOut       = FanOut( self.fingerprint )
+        # The objects of which the plugin is being created, name: ( object, immediate )
+        self.__pending      = {}
+        self.__cfgUpdate    = self.__cfgClass.UpdateIndex
+        self.__dependencies = DependencyGraph( [] )
+        cfg = self.__cfgClass.Configuration.get( 'monitor', {} )
+        # Seconds of estimated run time that may be started per tick, None is unlimited
+        self.__budget       = cfg.get( 'budget' )
+        self.__tick         = cfg.get( 'tick', 1.0 )
+        self.__loop         = EventLoopThread()
+        self.__loop.start()
+        self.__executor     = TaskExecutor( max_workers = cfg.get( 'workers', 8 ),
+                                            timeout = cfg.get( 'timeout', 300 ),
+                                            wakeup = self.__wakeup,
+                                            loop = self.__loop,
+                                            isolation = cfg.get( 'isolation', {} ),
+                                            concurrency_limit = cfg.get( 'concurrency_limit', 4 ) )
+        self.__scheduler    = TaskScheduler( catchup = cfg.get( 'catchup', 'once' ),
+                                             grace = cfg.get( 'grace', 60 ),
+                                             jitter = cfg.get( 'jitter', 'auto' ),
+                                             max_jitter = cfg.get( 'max_jitter', 300 ) )
+        self.__initializer  = ParallelInitializer( 'monitor', workers = cfg.get( 'init_workers', 8 ),
+                                                   timeout = cfg.get( 'init_timeout', 30 ),
+                                                   retry = cfg.get( 'init_retry', 60 ),
+                                                   discard = self.__discard,
+                                                   wakeup = self.__wakeup )
         self.loadModules()
         return
 
+    @staticmethod
+    def fingerprint( obj: dict ) -> str:
+        """The identity of the object configuration, without the bookkeeping of the loader"""
+        if C_FOREACH_FINGERPRINT in obj:
+            # A target of a 'foreach' definition
+            return obj[ C_FOREACH_FINGERPRINT ]
+
+        return json.dumps( { key: value for key, value in obj.items() if key not in ( 'index', 'update_dt' ) },
+                           sort_keys = True, default = str )
+
+    def __objects( self ) -> list:
+        """The configured objects, with the 'foreach' definitions expanded into their targets"""
+        return self.__fanOut.expand( self.__cfgClass.Configuration[ 'objects' ] )
+
+    def __accepts( self, obj: dict ) -> bool:
+        return self.__shard is None or self.__shard( obj.get( 'name' ) )
+
+    def __create( self, obj: dict ) -> MonitorPlugin:
+        self.log.info( f'Loading monitor: {obj}')
+        _class = resolvePluginClass( obj[ 'module' ] )
+        return _class( self, obj )
+
+    @staticmethod
+    def __discard( task: MonitorPlugin ) -> None:
+        if hasattr( task, 'stop' ):
+            task.stop()
+
+        return
+
+    def __load( self, objects: list, immediate: bool ) -> list:
+        """Creates the plugins of the objects in parallel. On startup ('immediate') it
+        returns the tasks created within their 'init_timeout', later it returns at once
+        so the monitor loop keeps running. The others are added by the monitor loop
+        when created in the background."""
+        for obj in objects:
+            self.__pending[ obj.get( 'name' ) ] = ( obj, immediate )
+
+        factories = { obj.get( 'name' ): partial( self.__create, obj ) for obj in objects }
+        timeouts = { obj.get( 'name' ): obj.get( 'init_timeout' ) for obj in objects }
+        if not immediate:
+            self.__initializer.submit( factories, timeouts )
+            return []
+
+        created = self.__initializer.create( factories, timeouts )
+        return [ self.__adopt( name, task ) for name, task in created ]
+
+    def __adopt( self, name: str, task: MonitorPlugin ) -> MonitorPlugin:
+        obj, immediate = self.__pending.pop( name )
+        self.append( task )
+        self.__fingerprints[ task.Name ] = self.fingerprint( obj )
+        self.__scheduler.add( task, immediate = immediate )
+        task.ConfigIndex = self.__cfgIndex
+        task.ConfigDateTime = datetime.now()
+        return task
+
+    def __cancel( self, name: str ) -> None:
+        self.__initializer.cancel( name )
+        self.__pending.pop( name, None )
+        return
+
+    def __unload( self, task: MonitorPlugin ) -> None:
+        """Removes the task, a running execution is left to finish"""
+        self.log.info( f'Unloading monitor: {task.Name}')
+        self.__scheduler.remove( task )
+        self.__executor.forget( task )
+        self.__waiting = [ waiting for waiting in self.__waiting if waiting is not task ]
+        self.__deferred = [ deferred for deferred in self.__deferred if deferred is not task ]
+        self.__fingerprints.pop( task.Name, None )
+        self.remove( task )
+        if hasattr( task, 'stop' ):
+            task.stop()
+
+        return
+
     def loadModules( self ):
+        """Creates the plugins of the enabled objects that are not loaded yet.
+
+        The plugin of a disabled object is not created (nor its module imported)
+        until the object gets enabled.
+        """
         self.__cfgIndex += 1
-        for obj in self.__cfgClass.Configuration[ 'objects' ]:
-            try:
-                module = obj[ 'module' ]
-                mod = None
-                self.log.info( f'Loading monitor: {obj}')
-                for mod_path in ( '', 'sysinvest.', 'sysinvest.monitor.' ):
-                    try:
-                        mod = importlib.import_module( f'{mod_path}{module}' )
-                        getattr(mod, 'CLASS_NAME')
-                        _class = getattr(mod, getattr(mod, 'CLASS_NAME'))
-                        executor = _class( self, obj )
-                        if executor not in self:
-                            self.append( executor )
-
-                        executor.ConfigIndex = self.__cfgIndex
-                        executor.ConfigDateTime = datetime.now()
-                        break
-
-                    except ModuleNotFoundError:
-                        pass
-
-                    except Exception as exc:
-                        self.log.error(f"Could not load {exc}")
-                        pass
-
-                if mod is None:
-                    self.log.error( f"Could not load {obj}")
-
-            except Exception:
-                self.log.exception( f"During module load: {obj}" )
+        loaded = { task.Name for task in self }
+        objects = []
+        for obj in self.__objects():
+            if obj.get( 'name' ) in loaded or obj.get( 'name' ) in self.__pending or not self.__accepts( obj ):
+                continue
+
+            if not obj.get( 'enabled', False ):
+                self.log.debug( f"Deferred loading disabled monitor: {obj.get( 'name' )}" )
+                continue
 
+            objects.append( obj )
+
+        # On startup all tasks run immediately, tasks added later on their next fire
+        self.__load( objects, immediate = self.__cfgIndex == 1 )
+
+        self.__dependencies = DependencyGraph( self )
         return
 
+    def reload( self ) -> dict:
+        """Applies a new configuration to the loaded tasks.
+
+        The objects are compared by name with the loaded tasks. A new or enabled object
+        is 'added', a removed or disabled object is 'removed'. When the configuration
+        of an object differs, its task is 'changed', either reconfigured in place or,
+        when the plugin cannot be reconfigured, rebuilt. Other tasks are 'unchanged'.
+        The plugins of the added and rebuilt tasks are created in the background, the
+        monitor loop adds these tasks when created.
+        """
+        self.__cfgIndex += 1
+        self.__cfgUpdate = self.__cfgClass.UpdateIndex
+        outcome = { 'added': [], 'removed': [], 'changed': [], 'unchanged': 0 }
+        objects = { obj.get( 'name' ): obj for obj in self.__objects() if self.__accepts( obj ) }
+        for name, ( obj, _ ) in list( self.__pending.items() ):
+            current = objects.get( name )
+            if current is None or not current.get( 'enabled', False ) or self.fingerprint( current ) != self.fingerprint( obj ):
+                # Not created yet, start over with the current configuration
+                self.__cancel( name )
+
+        rebuild = []
+        for task in list( self ):
+            obj = objects.get( task.Name )
+            if obj is None or not obj.get( 'enabled', False ):
+                self.__unload( task )
+                outcome[ 'removed' ].append( task.Name )
+                continue
+
+            fingerprint = self.fingerprint( obj )
+            if fingerprint == self.__fingerprints.get( task.Name ):
+                outcome[ 'unchanged' ] += 1
+                continue
+
+            outcome[ 'changed' ].append( task.Name )
+            if task.reconfigure( obj ):
+                self.log.info( f'Reconfigured monitor: {task.Name}')
+                self.__fingerprints[ task.Name ] = fingerprint
+                task.ConfigIndex = self.__cfgIndex
+                task.ConfigDateTime = datetime.now()
+                # The cron expression may have been changed
+                self.__scheduler.reschedule( task )
+
+            else:
+                self.__unload( task )
+                rebuild.append( obj )
+
+        loaded = { task.Name for task in self }
+        added = [ obj for name, obj in objects.items()
+                  if name not in loaded and name not in self.__pending and name not in outcome[ 'changed' ] and obj.get( 'enabled', False ) ]
+        # The plugins are created in the background and added by the monitor loop
+        self.__load( rebuild, immediate = False )
+        self.__load( added, immediate = False )
+        outcome[ 'added' ] = [ obj.get( 'name' ) for obj in added ]
+
+        self.__dependencies = DependencyGraph( self )
+        self.log.warning( f"Configuration reloaded, added: {len( outcome[ 'added' ] )}, "
+                          f"removed: {len( outcome[ 'removed' ] )}, changed: {len( outcome[ 'changed' ] )}, "
+                          f"unchanged: {outcome[ 'unchanged' ]}" )
+        return outcome
+
     def addToQueue( self, result ):
         self.log.info( f"Queue add {API.QUEUE.qsize()}" )
         API.QUEUE.put_nowait( result )
@@ -100,53 +271,213 @@ class Monitor( list ):
             'since':  startTime.strftime( '%Y-%m-%d %H:%M:%S' ),
             'uptime': f"{upTime.days} - {str(timedelta( seconds = upTime.seconds ))}",
             'passes': self.__passes,
-            'tasks':  len( self )
+            'tasks':  len( self ),
+            'deferred': self.__deferredRuns,
+            'shed':   self.__shedRuns,
+            'initializing': len( self.__pending ),
+            'abandoned': self.__executor.AbandonedThreads
         }
 
     def stop( self ):
         self.__event.set()
+        self.__wakeup.set()
+        return
+
+    def __unreachable( self, task: MonitorPlugin, failing: list ) -> None:
+        task_result = PluginResult( task )
+        task_result.update( False, f"Unreachable, depends on failing {', '.join( failing )}",
+                            unreachable = True, depends_on = failing )
+        API.QUEUE.put( task_result )
         return
 
+    @staticmethod
+    def estimate( task: MonitorPlugin ) -> float:
+        """The expected run time of the task, the median of its runs"""
+        return task.Statistics.P50 if task.Statistics.Runs > 0 else DEFAULT_ESTIMATE
+
+    def __budgeted( self, due: list ) -> list:
+        """Returns the tasks to start in this tick, the other tasks are deferred to the next tick.
+
+        Priority tasks and failing tasks go first and are never deferred. The other
+        tasks are started while the estimated run time fits the budget of the tick,
+        the tasks deferred before go first. A deferred task that is due again before
+        it ran is shed, only one run is kept.
+        """
+        if self.__budget is None:
+            return due
+
+        now = time.monotonic()
+        if now - self.__tickStart >= self.__tick:
+            self.__tickStart = now
+            self.__tickUsed = 0.0
+
+        for task in due:
+            if task in self.__deferred:
+                task.countShed()
+                self.__shedRuns += 1
+                self.log.warning( f"{task.Name} shed, due again while deferred" )
+
+        previous = self.__deferred
+        candidates = list( dict.fromkeys( previous + due ) )
+        urgent = [ task for task in candidates if task.Priority or task.LastResult is False ]
+        started = []
+        self.__deferred = []
+        for task in urgent + [ task for task in candidates if task not in urgent ]:
+            estimate = self.estimate( task )
+            if task in urgent or self.__tickUsed == 0 or self.__tickUsed + estimate <= self.__budget:
+                self.__tickUsed += estimate
+                started.append( task )
+
+            else:
+                if task not in previous:
+                    task.countDeferred()
+                    self.__deferredRuns += 1
+
+                self.__deferred.append( task )
+
+        if len( self.__deferred ) > len( previous ):
+            self.log.warning( f"Tick budget of {self.__budget} seconds exceeded, {len( self.__deferred )} tasks deferred" )
+
+        return started
+
+    def __dispatch( self, tasks: list ) -> list:
+        """Submits the tasks in dependency order, returns the tasks waiting for a running parent"""
+        waiting = []
+        for task in self.__dependencies.sort( list( dict.fromkeys( tasks ) ) ):
+            task: MonitorPlugin
+            if not task.Enabled:
+                continue
+
+            parents = self.__dependencies.parents( task )
+            if any( parent in waiting or self.__executor.isRunning( parent ) for parent in parents ):
+                # Evaluate after the outcome of the parents is known
+                waiting.append( task )
+                continue
+
+            failing = list( self.__dependencies.failing( task ) )
+            if len( failing ) > 0:
+                if task.OnDependsFailure == 'unreachable':
+                    self.log.warning( f"{task.Name} is unreachable, depends on failing {', '.join( failing )}" )
+                    self.__unreachable( task, failing )
+
+                else:
+                    self.log.warning( f"{task.Name} skipped, depends on failing {', '.join( failing )}" )
+
+                continue
+
+            self.__executor.submit( task )
+
+        return waiting
+
     def run( self ):
         wd = ProcessWatchdog()
-        isStarting = True
+        lastReload = time.monotonic()
         try:
             while not self.__event.is_set():
                 wd.trigger()
-                self.__passes += 1
-                start = int( time.time() )
-                for task in self:
-                    task: MonitorPlugin
-                    if not task.Enabled:
-                        continue
+                due = self.__scheduler.pop()
+                if len( due ) > 0:
+                    self.__passes += 1
+
+                # Collect the outcomes first, the waiting dependent tasks need them
+                for task, result in self.__executor.poll():
+                    task.LastResult = bool( result )
+                    if task.adapt( bool( result ) ) and task in self.__scheduler:
+                        # Snap back to the cron interval, do not wait for a stretched fire
+                        self.__scheduler.reschedule( task )
 
-                    if not pycron.is_now( task.Cron ) and not isStarting:
-                        continue
+                self.__waiting = self.__dispatch( self.__waiting + self.__budgeted( due ) )
+                # The plugins that were created in the background
+                created = [ self.__adopt( name, task ) for name, task in self.__initializer.poll() ]
+                if len( created ) > 0:
+                    self.log.info( f"Added monitors: {', '.join( task.Name for task in created )}" )
+                    self.__dependencies = DependencyGraph( self )
 
-                    self.log.info( f"{task.Name} is being started" )
-                    if task.execute():
-                        task.resetHits()
+                if self.__cfgClass.UpdateIndex != self.__cfgUpdate:
+                    self.reload()
 
-                    self.log.info( f"{task.Name} is finished" )
+                elif time.monotonic() - lastReload >= 60:
+                    lastReload = time.monotonic()
+                    if len( self ) + len( self.__pending ) < len( self.__objects() ):
+                        # Retry the objects that could not be loaded
+                        self.loadModules()
 
-                isStarting = False
-                # Loop time should be about a minute, sleep the remaining time
-                sleepTime = 60 - ( int( time.time() ) - start )
-                self.log.info( f"Sleep time: {sleepTime}" )
-                if sleepTime > 0:
-                    self.__event.wait( sleepTime )
+                # Sleep until the next task is due, a task finishes or times out,
+                # meanwhile keep the watchdog fed.
+                sleepTime = wd.Timeout / 3
+                nextTick = self.__tickStart + self.__tick - time.monotonic() if len( self.__deferred ) > 0 else None
+                for timeout in ( self.__scheduler.timeUntilNext(), self.__executor.nextTimeout(), nextTick ):
+                    if timeout is not None:
+                        sleepTime = min( sleepTime, timeout )
 
-                if len( self ) < len( self.__cfgClass.Configuration[ 'objects' ] ):
-                    # We need to load more modules
-                    self.loadModules()
+                self.log.debug( f"Sleep time: {sleepTime}" )
+                self.__wakeup.wait( sleepTime )
+                self.__wakeup.clear()
 
         except:
             raise
 
         finally:
-            # Stop all threaded tasks
-            for task in self:
-                if hasattr( task, 'stop' ):
-                    task.stop()
+            self.shutdown()
+
+        return
+
+    def runOnce( self ) -> list:
+        """Runs all enabled tasks at once, ignoring their cron, and waits until they
+        are finished or timed out. The dependencies between the tasks are respected.
+
+        Returns per task a tuple of the name, the result (None when not run) and the
+        duration in seconds. An enabled object of which the plugin could not be created
+        (in time) is included as not run.
+        """
+        results = {}
+        self.__passes += 1
+        self.__waiting = self.__dispatch( [ task for task in self if task.Enabled ] )
+        while not self.__event.is_set():
+            for task, result in self.__executor.poll():
+                task.LastResult = bool( result )
+                results[ task.Name ] = bool( result )
+
+            created = [ self.__adopt( name, task ) for name, task in self.__initializer.poll() ]
+            if len( created ) > 0:
+                self.__dependencies = DependencyGraph( self )
+                self.__waiting += [ task for task in created if task.Enabled ]
+
+            self.__waiting = self.__dispatch( self.__waiting )
+            if self.__executor.Running == 0 and len( self.__waiting ) == 0:
+                break
+
+            sleepTime = self.__executor.nextTimeout()
+            self.__wakeup.wait( 1 if sleepTime is None else sleepTime )
+            self.__wakeup.clear()
+
+        summary = [ ( task.Name, results.get( task.Name ), task.Statistics.Last if task.Name in results else None )
+                    for task in self if task.Enabled ]
+        loaded = { task.Name for task in self }
+        for obj in self.__objects():
+            if obj.get( 'enabled', False ) and self.__accepts( obj ) and obj.get( 'name' ) not in loaded:
+                self.log.error( f"{obj.get( 'name' )} not run, its plugin could not be created" )
+                summary.append( ( obj.get( 'name' ), None, None ) )
+
+        return summary
+
+    @property
+    def Lateness( self ):
+        """Statistics of how late the tasks were started after their due time"""
+        return self.__scheduler.Lateness
+
+    @property
+    def Abandoned( self ) -> int:
+        """Timed out tasks that are still running in a worker thread"""
+        return self.__executor.Abandoned
+
+    def shutdown( self ) -> None:
+        self.__initializer.stop()
+        self.__executor.shutdown()
+        self.__loop.stop()
+        # Stop all threaded tasks
+        for task in self:
+            if hasattr( task, 'stop' ):
+                task.stop()
 
         return
@@ -1,3 +1,4 @@
 from sysinvest.common.plugin.monitor import MonitorPlugin
+from sysinvest.common.plugin.streaming import StreamingMonitorPlugin
 from sysinvest.common.plugin.report import ReportPlugin
-from sysinvest.common.plugin.result import PluginResult
\ No newline at end of file
+from sysinvest.common.plugin.result import PluginResult, PluginResultBatch
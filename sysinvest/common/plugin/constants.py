@@ -32,4 +32,12 @@ C_PID           = 'pid'
 C_CREATE_TIME   = 'create_time'
 C_PID_FILE      = 'pidfile'
 C_GROUP         = 'group'
-C_PRIORITY      = 'priority'
\ No newline at end of file
+C_PRIORITY      = 'priority'
+C_TIMEOUT       = 'timeout'
+C_ISOLATION     = 'isolation'
+C_OVERRUN       = 'overrun'
+C_ADAPTIVE      = 'adaptive'
+C_DEPENDS_ON    = 'depends_on'
+C_ON_DEPENDS_FAILURE = 'on_depends_failure'
+C_CONCURRENCY   = 'concurrency'
+C_STREAM        = 'stream'
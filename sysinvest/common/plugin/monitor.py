@@ -17,10 +17,16 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
+from typing import Optional
 import time
+import asyncio
+import inspect
 import logging
+import functools
 from datetime import datetime
 from sysinvest.common.plugin.base import PluginBase
+from sysinvest.common.runstats import RunStatistics
+from sysinvest.common.plugin.result import SubTask
 import sysinvest.common.plugin.constants as const
 
 
@@ -30,6 +36,15 @@ class MonitorPlugin( PluginBase ):
         self.__lasttime = 0
         self.__runOnStartup = False
         self.__hit = 0
+        self.__skipped = 0
+        self.__coalesced = 0
+        self.__deferred = 0
+        self.__shed = 0
+        self.__statistics = RunStatistics()
+        self.__intervalFactor = 1
+        self.__lastResult = None
+        self.__stableRuns = 0
+        self.__subTasks = {}
         self.log = logging.getLogger( f"plugin.{self.__class__.__name__}")
         return
 
@@ -53,6 +68,144 @@ class MonitorPlugin( PluginBase ):
     def Priority( self ) -> bool:
         return self.Config.get( const.C_PRIORITY, False )
 
+    @property
+    def IsAsync( self ) -> bool:
+        return inspect.iscoroutinefunction( self.execute )
+
+    @property
+    def Isolation( self ) -> str:
+        return self.Config.get( const.C_ISOLATION, 'thread' )
+
+    @property
+    def Overrun( self ) -> str:
+        return self.Config.get( const.C_OVERRUN, 'skip' )
+
+    @property
+    def SkippedRuns( self ) -> int:
+        return self.__skipped
+
+    @property
+    def CoalescedRuns( self ) -> int:
+        return self.__coalesced
+
+    def countSkipped( self ) -> None:
+        self.__skipped += 1
+        return
+
+    def countCoalesced( self ) -> None:
+        self.__coalesced += 1
+        return
+
+    @property
+    def DeferredRuns( self ) -> int:
+        return self.__deferred
+
+    @property
+    def ShedRuns( self ) -> int:
+        return self.__shed
+
+    def countDeferred( self ) -> None:
+        self.__deferred += 1
+        return
+
+    def countShed( self ) -> None:
+        self.__shed += 1
+        return
+
+    @property
+    def Statistics( self ) -> RunStatistics:
+        return self.__statistics
+
+    @property
+    def DependsOn( self ) -> list:
+        depends = self.Config.get( const.C_DEPENDS_ON, [] )
+        return [ depends ] if isinstance( depends, str ) else list( depends or [] )
+
+    @property
+    def OnDependsFailure( self ) -> str:
+        """'skip' or 'unreachable' when a task this task depends on is failing"""
+        return self.Config.get( const.C_ON_DEPENDS_FAILURE, 'skip' )
+
+    @property
+    def LastResult( self ) -> Optional[bool]:
+        """The outcome of the last run, None when the task did not run yet"""
+        return self.__lastResult
+
+    @LastResult.setter
+    def LastResult( self, value: bool ):
+        self.__lastResult = value
+        return
+
+    @property
+    def ConcurrencyKey( self ) -> Optional[str]:
+        """The resource the task puts load on, tasks with the same key are limited
+        in how many run at the same time. By default the target of the plugin."""
+        concurrency = self.Config.get( const.C_CONCURRENCY )
+        if isinstance( concurrency, dict ) and concurrency.get( 'key' ) is not None:
+            return str( concurrency.get( 'key' ) )
+
+        elif isinstance( concurrency, str ):
+            return concurrency
+
+        return self.defaultConcurrencyKey()
+
+    @property
+    def ConcurrencyLimit( self ) -> Optional[int]:
+        """The number of tasks with the same key that may run at once, None for the monitor default"""
+        concurrency = self.Config.get( const.C_CONCURRENCY )
+        return concurrency.get( 'limit' ) if isinstance( concurrency, dict ) else None
+
+    def defaultConcurrencyKey( self ) -> Optional[str]:
+        return None
+
+    @property
+    def Adaptive( self ) -> Optional[dict]:
+        """The adaptive interval settings, None when the interval is fixed"""
+        adaptive = self.Config.get( const.C_ADAPTIVE, False )
+        if adaptive is True:
+            adaptive = {}
+
+        if not isinstance( adaptive, dict ):
+            return None
+
+        return {
+            'max_interval': adaptive.get( 'max_interval', 3600 ),
+            'stable':       adaptive.get( 'stable', 3 )
+        }
+
+    @property
+    def IntervalFactor( self ) -> int:
+        """Multiplier of the cron interval, grows while the task is stable"""
+        return self.__intervalFactor
+
+    def adapt( self, ok: bool ) -> bool:
+        """Updates the interval factor with the outcome of a run,
+        returns True when the interval snapped back to the cron interval"""
+        adaptive = self.Adaptive
+        if adaptive is None:
+            return False
+
+        if not ok:
+            snapped = self.__intervalFactor > 1
+            self.__intervalFactor = 1
+            self.__stableRuns = 0
+            if snapped:
+                self.log.info( f"{self.Name} failed, back to the cron interval" )
+
+            return snapped
+
+        self.__stableRuns += 1
+        if self.__stableRuns >= adaptive[ 'stable' ]:
+            self.__stableRuns = 0
+            self.__intervalFactor *= 2
+            self.log.info( f"{self.Name} is stable, interval factor {self.__intervalFactor}" )
+
+        return False
+
+    @property
+    def Timeout( self ) -> int:
+        return self.Config.get( const.C_TIMEOUT, None )
+
     @property
     def Name( self ) -> str:
         return self.Config.get( const.C_NAME, 'unknown' )
@@ -84,6 +237,13 @@ class MonitorPlugin( PluginBase ):
 
         return self.Config.get( 'template', default_templ ).replace( '\\n', '\n' )
 
+    def reconfigure( self, config: dict ) -> bool:
+        """Applies a changed configuration, returns False when the plugin must be
+        rebuilt instead, for instance when it holds connections or threads set up
+        from the configuration"""
+        self.configure( config )
+        return True
+
     def runOnStartup( self ) -> None:
         self.__runOnStartup = True
         return
@@ -94,6 +254,10 @@ class MonitorPlugin( PluginBase ):
         self.log.info(f"Increment hit counter: {self.__hit}")
         return False
 
+    async def runBlocking( self, func, *args, **kwargs ):
+        """For asynchronous plugins, runs a blocking call in the executor of the event loop"""
+        return await asyncio.get_running_loop().run_in_executor( None, functools.partial( func, *args, **kwargs ) )
+
     @property
     def Ticket( self ):
         return self.Config.get( 'ticket', True )
@@ -105,6 +269,10 @@ class MonitorPlugin( PluginBase ):
         return hits
 
 
+    @property
+    def HitCounter( self ) -> int:
+        return self.__hit
+
     def hitsReached( self ) -> bool:
         hits = self.Config.get('hits', 1)
         self.log.info(f"hitsReached: {hits <= self.__hit} (hit counter: {self.__hit}/{hits})")
@@ -114,3 +282,11 @@ class MonitorPlugin( PluginBase ):
         self.log.info(f"Reset hit counter: {self.__hit}")
         self.__hit = 0
         return
+
+    def subTask( self, key: str ) -> SubTask:
+        """The sub task of a target, for the results of a PluginResultBatch"""
+        subTask = self.__subTasks.get( key )
+        if subTask is None:
+            subTask = self.__subTasks[ key ] = SubTask( self, key )
+
+        return subTask
@@ -17,6 +17,7 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
+from typing import List
 import logging
 from sysinvest.common.plugin.base import PluginBase
 
@@ -36,6 +37,14 @@ class ReportPlugin( PluginBase ):
     def notify( self, result: 'PluginResult' ):
         raise NotImplemented()
 
+    def notifyBatch( self, results: List[ 'PluginResult' ] ):
+        """Notifies the results that were queued together, a reporter can override
+        this to render, write or insert once per batch"""
+        for result in results:
+            self.notify( result )
+
+        return
+
     def publish( self ):
         raise NotImplemented()
 
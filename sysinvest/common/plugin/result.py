@@ -17,8 +17,9 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
-from typing import Optional
+from typing import Iterator, List, Optional
 import json
+from functools import lru_cache
 from datetime import datetime, date, time, timedelta
 from mako.template import Template
 import mako.exceptions
@@ -26,6 +27,12 @@ import sysinvest.common.plugin.constants as const
 import logging
 
 
+@lru_cache( maxsize = 1024 )
+def compileTemplate( text: str ) -> Template:
+    """The compiled Mako template, templates are compiled once"""
+    return Template( text )
+
+
 class PluginResultEncoder( json.JSONEncoder ):
     def default( self, obj ):
         if isinstance( obj, Exception ):
@@ -76,6 +83,7 @@ class PluginResult( object ):
         for k, v in self.Plugin.Parent.info().items():
             self.__data[ k ] = v
 
+        self.__resetSubTask()
         self.log.info( f"PluginResult.update( {result}, '{message}', {data}, **{kwargs} )" )
         return
 
@@ -109,6 +117,12 @@ class PluginResult( object ):
     def Plugin( self ) -> 'Plugin':
         return self.__plugin
 
+    @property
+    def Statistics( self ) -> dict:
+        """The run statistics of the plugin, empty when the plugin keeps none"""
+        statistics = getattr( self.__plugin, 'Statistics', None )
+        return statistics.info() if statistics is not None else {}
+
     def buildMessage( self, translate: Optional[list] = None ) -> str:
         result = ''
         kwargs = {
@@ -117,6 +131,7 @@ class PluginResult( object ):
             'message': self.__message,
         }
         kwargs.update( self.__data )
+        kwargs[ 'statistics' ] = self.Statistics
         kwargs[ 'hasAttribute' ] = HasAttribute( kwargs )
         kwargs[ 'datetime' ] = datetime
         kwargs[ 'date' ] = date
@@ -124,10 +139,10 @@ class PluginResult( object ):
         kwargs[ 'timedelta' ] = timedelta
         try:
             if const.C_EXCEPTION in self.__data:
-                return Template( self.EXC_TEMPLATE ).render( **kwargs )
+                return compileTemplate( self.EXC_TEMPLATE ).render( **kwargs )
 
             template = self.Plugin.Template if self.Plugin.Template is not None else self.TEMPLATE
-            result = Template( template ).render( **kwargs ).strip( ' \r\n' )
+            result = compileTemplate( template ).render( **kwargs ).strip( ' \r\n' )
             if isinstance( translate, list ):
                 try:
                     for ch, tr in translate:
@@ -150,9 +165,124 @@ class PluginResult( object ):
         if self.__data:
             print( self.__data )
 
+    def toDict( self ) -> dict:
+        return {
+            "result": self.__result,
+            "message": self.__message,
+            "state": self.__state,
+            "details": dict( self.__data )
+        }
+
+    def fromDict( self, data: dict ) -> None:
+        self.__result = data.get( 'result', False )
+        self.__message = data.get( 'message', '' )
+        self.__state = data.get( 'state', 2 )
+        self.__data.update( data.get( 'details', {} ) )
+        self.__resetSubTask()
+        return
+
+    def __resetSubTask( self ) -> None:
+        # The hits of a sub task count the consecutive failures, as the executor
+        # does for the plugin
+        if self.__result and isinstance( self.__plugin, SubTask ):
+            self.__plugin.resetHits()
+
+        return
+
     def toJson( self ):
         return {
             "name": self.Name,
             "result": self.Result,
-            "message": self.buildMessage()
-        }
\ No newline at end of file
+            "message": self.buildMessage(),
+            "statistics": self.Statistics
+        }
+
+class SubTask( object ):
+    """Stands in for the plugin in the result of one target of a batch. The sub task
+    has its own name and hit counter, the other properties are those of the plugin."""
+    def __init__( self, plugin: 'Plugin', key: str ):
+        self.__plugin = plugin
+        self.__key = key
+        self.__hit = 0
+        return
+
+    def __getattr__( self, item ):
+        return getattr( self.__plugin, item )
+
+    @property
+    def Name( self ) -> str:
+        return f"{self.__plugin.Name}: {self.__key}"
+
+    @property
+    def Key( self ) -> str:
+        return self.__key
+
+    @property
+    def Plugin( self ) -> 'Plugin':
+        return self.__plugin
+
+    @property
+    def HitCounter( self ) -> int:
+        return self.__hit
+
+    def hit( self ) -> None:
+        self.__hit += 1
+        return
+
+    def hitsReached( self ) -> bool:
+        return self.__plugin.Hits <= self.__hit
+
+    def resetHits( self ):
+        self.__hit = 0
+        return
+
+
+class PluginResultBatch( object ):
+    """The results of the targets checked by one execution of a plugin, put on the
+    API.QUEUE at once. Each target has its own result and hit counter.
+
+        batch = PluginResultBatch( self )
+        for filename in filenames:
+            batch.add( filename ).update( os.path.exists( filename ), ... )
+
+        API.QUEUE.put( batch )
+        return batch.Result
+    """
+    def __init__( self, plugin: 'Plugin' ):
+        self.__plugin = plugin
+        self.__results: List[ PluginResult ] = []
+        return
+
+    def add( self, key: str ) -> PluginResult:
+        """The result of the target 'key', to be updated by the plugin"""
+        subTask = self.__plugin.subTask( key )
+        subTask.hit()
+        result = PluginResult( subTask )
+        self.__results.append( result )
+        return result
+
+    @property
+    def Name( self ) -> str:
+        return self.__plugin.Name
+
+    @property
+    def Plugin( self ) -> 'Plugin':
+        return self.__plugin
+
+    @property
+    def Result( self ) -> bool:
+        """True when the results of all targets are ok"""
+        return all( result.Result for result in self.__results )
+
+    @property
+    def Results( self ) -> List[ PluginResult ]:
+        return self.__results
+
+    def __iter__( self ) -> Iterator[ PluginResult ]:
+        return iter( self.__results )
+
+    def __len__( self ):
+        return len( self.__results )
+
+    def __repr__( self ):
+        return f"<PluginResultBatch {self.Name} {len( self.__results )} results>"
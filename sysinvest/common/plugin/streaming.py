@@ -0,0 +1,113 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import Any, Optional
+import time
+from threading import Lock
+from sysinvest.common.plugin.monitor import MonitorPlugin
+from sysinvest.common.plugin.result import PluginResult
+import sysinvest.common.plugin.constants as const
+import sysinvest.common.api as API
+
+
+class StreamingMonitorPlugin( MonitorPlugin ):
+    """A plugin that samples continuously and pushes its result as soon as its state changes.
+
+    The plugin calls changed() when it has new data, evaluate() builds the result
+    from the current data. A changed state is pushed at most once per 'min_interval'
+    seconds, a state that is still changed after that is pushed with the next data.
+    The scheduled execute() passes its result to heartbeat(), which only pushes when
+    nothing was pushed for 'heartbeat' seconds. With 'stream: false' every execute()
+    pushes its result, as for the other plugins.
+    """
+    def __init__( self, parent, config: dict ):
+        super().__init__( parent, config )
+        self.__lock = Lock()
+        self.__state = None
+        self.__lastPush = None
+        return
+
+    @property
+    def Stream( self ) -> Optional[dict]:
+        """The streaming settings, None when streaming is disabled"""
+        stream = self.Config.get( const.C_STREAM, True )
+        if stream is True:
+            stream = {}
+
+        if not isinstance( stream, dict ):
+            return None
+
+        return {
+            'min_interval': stream.get( 'min_interval', 10 ),
+            'heartbeat':    stream.get( 'heartbeat', 600 )
+        }
+
+    def evaluate( self ) -> Optional[PluginResult]:
+        """The result of the current data, None while there is no data"""
+        raise NotImplementedError()
+
+    def stateOf( self, result: PluginResult ) -> Any:
+        """The state of a result, a change of the state is pushed"""
+        return result.Result
+
+    def __push( self, result: PluginResult, state: Any ) -> None:
+        # Called with the lock held
+        self.__state = state
+        self.__lastPush = time.monotonic()
+        API.QUEUE.put( result )
+        return
+
+    def changed( self, *args ) -> None:
+        """New data is available, pushes the result when its state changed"""
+        stream = self.Stream
+        if stream is None:
+            return
+
+        try:
+            result = self.evaluate()
+
+        except Exception:
+            self.log.exception( f"Evaluating {self.Name}" )
+            return
+
+        if result is None:
+            return
+
+        state = self.stateOf( result )
+        with self.__lock:
+            if self.__lastPush is not None:
+                if state == self.__state or time.monotonic() - self.__lastPush < stream[ 'min_interval' ]:
+                    return
+
+            self.log.info( f"{self.Name} changed state to {state}" )
+            self.__push( result, state )
+
+        return
+
+    def heartbeat( self, result: PluginResult ) -> bool:
+        """Pushes the result of a scheduled execution when streaming is disabled,
+        the state changed or nothing was pushed for 'heartbeat' seconds"""
+        stream = self.Stream
+        state = self.stateOf( result )
+        with self.__lock:
+            if stream is None or self.__lastPush is None or state != self.__state or \
+                    time.monotonic() - self.__lastPush >= stream[ 'heartbeat' ]:
+                self.__push( result, state )
+
+        return result.Result
@@ -0,0 +1,192 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import List, Optional
+import time
+import logging
+from collections import deque
+from threading import Thread, Condition
+from sysinvest.common.plugin import ReportPlugin, PluginResult
+from sysinvest.common.runstats import RunStatistics
+from sysinvest.common.resultqueue import ResultQueue
+
+
+C_NOTIFY    = 'notify'
+C_PUBLISH   = 'publish'
+
+
+class ReporterWorker( Thread ):
+    """Runs a reporter on its own thread with its own bounded queue.
+
+    A slow reporter only delays itself, the collector never waits for it. When
+    the queue is full the oldest batch is dropped, a publish that is already
+    waiting is not queued again. The results of the plugins with 'priority: true'
+    go in a separate lane that is processed first and is never dropped, as in the
+    ResultQueue. The lag is the time from queueing a batch or publish until the
+    reporter finished it.
+    """
+    def __init__( self, reporter: ReportPlugin, queue_size: int = 100 ):
+        super().__init__( name = f"reporter-{reporter.Name}", daemon = True )
+        self.log            = logging.getLogger( 'collector' )
+        self.__reporter     = reporter
+        self.__queueSize    = queue_size
+        self.__cond         = Condition()
+        self.__queue        = deque()
+        self.__priority     = deque()
+        self.__busy         = False
+        self.__stopped      = False
+        self.__lag          = RunStatistics()
+        self.__errors       = 0
+        self.__dropped      = 0
+        # The results of the priority lane not queued because the worker was stopped
+        self.__droppedPriority = 0
+        return
+
+    @property
+    def Reporter( self ) -> ReportPlugin:
+        return self.__reporter
+
+    @property
+    def Lag( self ) -> RunStatistics:
+        return self.__lag
+
+    @property
+    def Depth( self ) -> int:
+        with self.__cond:
+            return len( self.__queue ) + len( self.__priority )
+
+    @property
+    def Errors( self ) -> int:
+        return self.__errors
+
+    @property
+    def Dropped( self ) -> int:
+        """The results dropped because the queue was full or the worker was stopped"""
+        return self.__dropped + self.__droppedPriority
+
+    def __put( self, kind: str, results: Optional[ List[ PluginResult ] ] = None ) -> None:
+        with self.__cond:
+            if self.__stopped:
+                self.__dropped += len( results or [] )
+                return
+
+            if kind == C_PUBLISH and any( item[ 0 ] == C_PUBLISH for item in self.__queue ):
+                return
+
+            while len( self.__queue ) >= self.__queueSize:
+                dropped = next( ( item for item in self.__queue if item[ 0 ] == C_NOTIFY ), None )
+                if dropped is None:
+                    break
+
+                self.__queue.remove( dropped )
+                self.__dropped += len( dropped[ 1 ] )
+                self.log.warning( f"Reporter {self.__reporter.Name} is behind, dropped {len( dropped[ 1 ] )} results" )
+
+            self.__queue.append( ( kind, results, time.monotonic() ) )
+            self.__cond.notify_all()
+
+        return
+
+    def __putPriority( self, results: List[ PluginResult ] ) -> None:
+        with self.__cond:
+            if self.__stopped:
+                self.__droppedPriority += len( results )
+                return
+
+            self.__priority.append( ( C_NOTIFY, results, time.monotonic() ) )
+            self.__cond.notify_all()
+
+        return
+
+    def notifyBatch( self, results: List[ PluginResult ] ) -> None:
+        priority = [ result for result in results if ResultQueue.isPriority( result ) ]
+        if len( priority ) > 0:
+            self.__putPriority( priority )
+            results = [ result for result in results if not ResultQueue.isPriority( result ) ]
+            if len( results ) == 0:
+                return
+
+        self.__put( C_NOTIFY, results )
+        return
+
+    def publish( self ) -> None:
+        self.__put( C_PUBLISH )
+        return
+
+    def wait( self, timeout: Optional[float] = None ) -> bool:
+        """Waits until the queue is processed, returns False on a timeout"""
+        with self.__cond:
+            return self.__cond.wait_for( lambda: len( self.__queue ) + len( self.__priority ) == 0 and not self.__busy,
+                                         timeout )
+
+    def stop( self ) -> None:
+        with self.__cond:
+            self.__stopped = True
+            self.__cond.notify_all()
+
+        return
+
+    def run( self ) -> None:
+        while True:
+            with self.__cond:
+                self.__cond.wait_for( lambda: len( self.__queue ) + len( self.__priority ) > 0 or self.__stopped )
+                if self.__stopped:
+                    break
+
+                if len( self.__priority ) > 0:
+                    kind, results, queued = self.__priority.popleft()
+
+                else:
+                    kind, results, queued = self.__queue.popleft()
+                self.__busy = True
+
+            ok = True
+            try:
+                if kind == C_NOTIFY:
+                    self.__reporter.notifyBatch( results )
+
+                else:
+                    self.__reporter.publish()
+
+            except Exception as exc:
+                ok = False
+                self.__errors += 1
+                self.log.exception( f"Exception in {self.__reporter.Name}: {exc}" )
+
+            self.__lag.record( time.monotonic() - queued, None, ok )
+            with self.__cond:
+                self.__busy = False
+                self.__cond.notify_all()
+
+        return
+
+    def info( self ) -> dict:
+        with self.__cond:
+            lanes = {
+                'normal':   { 'depth': len( self.__queue ), 'dropped': self.__dropped },
+                'priority': { 'depth': len( self.__priority ), 'dropped': self.__droppedPriority }
+            }
+
+        return {
+            'depth':    lanes[ 'normal' ][ 'depth' ] + lanes[ 'priority' ][ 'depth' ],
+            'errors':   self.__errors,
+            'dropped':  self.Dropped,
+            'lanes':    lanes,
+            'lag':      self.__lag.info()
+        }
@@ -0,0 +1,223 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import Any, Optional
+import time
+import logging
+from queue import Empty
+from collections import deque, OrderedDict
+from threading import Condition, Lock
+
+
+class ResultQueue( object ):
+    """The queue of the results for the collector, with the interface of queue.Queue.
+
+    The results of the plugins with 'priority: true' go in a separate lane that
+    is always drained first. get() blocks until a result arrives, so the collector
+    wakes as soon as there is something to report.
+
+    The queue holds at most 'maxsize' results. A producer that finds the queue
+    full waits up to 'backpressure' seconds for room. After that only the newest
+    result of the task is kept: the queued results with the same name are
+    coalesced, or else the oldest result of a task with more than one queued
+    result. Only when every task has a single result queued, the oldest result
+    is dropped. Priority results are never dropped. A 'maxsize' of 0 is unbounded.
+    """
+    def __init__( self, maxsize: int = 0, backpressure: float = 0 ):
+        self.log            = logging.getLogger( 'collector' )
+        self.__maxsize      = maxsize
+        self.__backpressure = backpressure
+        self.__lock         = Lock()
+        self.__cond         = Condition( self.__lock )
+        self.__notFull      = Condition( self.__lock )
+        self.__allDone      = Condition( self.__lock )
+        self.__priority     = deque()
+        # The normal lane in queue order by sequence number, with the sequence numbers per name
+        self.__normal       = OrderedDict()
+        self.__names        = {}
+        self.__sequence     = 0
+        self.__unfinished   = 0
+        self.__interrupted  = False
+        self.__dropped      = 0
+        self.__coalesced    = 0
+        return
+
+    @staticmethod
+    def isPriority( item: Any ) -> bool:
+        plugin = getattr( item, 'Plugin', None )
+        return bool( getattr( plugin, 'Priority', False ) )
+
+    @property
+    def Dropped( self ) -> int:
+        """The results dropped because the queue was full"""
+        return self.__dropped
+
+    @property
+    def Coalesced( self ) -> int:
+        """The results replaced by a newer result of the same task because the queue was full"""
+        return self.__coalesced
+
+    def __full( self ) -> bool:
+        return self.__maxsize > 0 and len( self.__priority ) + len( self.__normal ) >= self.__maxsize
+
+    def __discard( self, sequence: int ) -> None:
+        # Called with the lock held
+        item = self.__normal.pop( sequence )
+        name = getattr( item, 'Name', None )
+        self.__names[ name ].remove( sequence )
+        if len( self.__names[ name ] ) == 0:
+            del self.__names[ name ]
+
+        self.__unfinished -= 1
+        if self.__unfinished == 0:
+            self.__allDone.notify_all()
+
+        return
+
+    def __makeRoom( self, name: str ) -> None:
+        # Called with the lock held
+        sequences = list( self.__names.get( name, [] ) )
+        if len( sequences ) > 0:
+            for sequence in sequences:
+                self.__discard( sequence )
+
+            self.__coalesced += len( sequences )
+            return
+
+        for sequence, item in self.__normal.items():
+            # Keep the only result of a task, a newer result of this task is queued
+            other = getattr( item, 'Name', None )
+            if other is not None and len( self.__names[ other ] ) > 1:
+                self.__discard( sequence )
+                self.__coalesced += 1
+                return
+
+        if len( self.__normal ) > 0:
+            self.__discard( next( iter( self.__normal ) ) )
+            self.__dropped += 1
+            if self.__dropped % 1000 == 1:
+                self.log.warning( f"Result queue full, dropped {self.__dropped} results so far" )
+
+        return
+
+    def put( self, item: Any, block: bool = True, timeout: Optional[float] = None ) -> None:
+        with self.__lock:
+            if self.isPriority( item ):
+                self.__priority.append( item )
+
+            else:
+                if self.__full() and block and self.__backpressure > 0:
+                    wait = self.__backpressure if timeout is None else min( timeout, self.__backpressure )
+                    self.__notFull.wait_for( lambda: not self.__full(), wait )
+
+                if self.__full():
+                    self.__makeRoom( getattr( item, 'Name', None ) )
+
+                self.__sequence += 1
+                self.__normal[ self.__sequence ] = item
+                self.__names.setdefault( getattr( item, 'Name', None ), deque() ).append( self.__sequence )
+
+            self.__unfinished += 1
+            self.__cond.notify()
+
+        return
+
+    def put_nowait( self, item: Any ) -> None:
+        self.put( item, False )
+        return
+
+    def get( self, block: bool = True, timeout: Optional[float] = None ) -> Any:
+        """The next result, a priority result first. Raises queue.Empty when there is
+        no result within the timeout or when the waiting is interrupted."""
+        with self.__lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while len( self.__priority ) == 0 and len( self.__normal ) == 0:
+                if not block or self.__interrupted:
+                    self.__interrupted = False
+                    raise Empty()
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty()
+
+                self.__cond.wait( remaining )
+
+            if len( self.__priority ) > 0:
+                item = self.__priority.popleft()
+
+            else:
+                sequence, item = self.__normal.popitem( last = False )
+                name = getattr( item, 'Name', None )
+                self.__names[ name ].popleft()
+                if len( self.__names[ name ] ) == 0:
+                    del self.__names[ name ]
+
+            self.__notFull.notify()
+            return item
+
+    def get_nowait( self ) -> Any:
+        return self.get( False )
+
+    def interrupt( self ) -> None:
+        """Wakes a waiting get(), it raises queue.Empty when there is no result"""
+        with self.__lock:
+            self.__interrupted = True
+            self.__cond.notify_all()
+
+        return
+
+    def task_done( self ) -> None:
+        with self.__lock:
+            if self.__unfinished <= 0:
+                raise ValueError( 'task_done() called too many times' )
+
+            self.__unfinished -= 1
+            if self.__unfinished == 0:
+                self.__allDone.notify_all()
+
+        return
+
+    def join( self ) -> None:
+        with self.__lock:
+            while self.__unfinished > 0:
+                self.__allDone.wait()
+
+        return
+
+    def qsize( self ) -> int:
+        with self.__lock:
+            return len( self.__priority ) + len( self.__normal )
+
+    def empty( self ) -> bool:
+        return self.qsize() == 0
+
+    @property
+    def PrioritySize( self ) -> int:
+        with self.__lock:
+            return len( self.__priority )
+
+    def info( self ) -> dict:
+        with self.__lock:
+            return {
+                'size':         len( self.__priority ) + len( self.__normal ),
+                'priority':     len( self.__priority ),
+                'maxsize':      self.__maxsize,
+                'dropped':      self.__dropped,
+                'coalesced':    self.__coalesced
+            }
@@ -0,0 +1,143 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import Optional
+import math
+from threading import Lock
+
+
+class RunStatistics( object ):
+    """Execution statistics of a monitor task.
+
+    The wall times are kept in a histogram with logarithmic buckets, each bucket
+    is GROWTH times wider than the previous one. This keeps the memory use fixed
+    while the percentiles are accurate to about 10 percent, the width of a bucket
+    (2 ** 0.125 is 9 percent).
+    """
+    MINIMUM     = 0.001
+    GROWTH      = 2 ** 0.125
+
+    def __init__( self ):
+        self.__lock     = Lock()
+        self.__buckets  = {}
+        self.__runs     = 0
+        self.__failures = 0
+        self.__timeouts = 0
+        self.__wall     = 0.0
+        self.__cpu      = 0.0
+        self.__max      = 0.0
+        self.__last     = None
+        return
+
+    def __bucket( self, value: float ) -> int:
+        if value <= self.MINIMUM:
+            return 0
+
+        return math.ceil( math.log( value / self.MINIMUM, self.GROWTH ) )
+
+    def record( self, wall: float, cpu: Optional[float], ok: bool, timeout: bool = False ) -> None:
+        """Records a run, 'cpu' is None when the CPU time could not be measured"""
+        with self.__lock:
+            bucket = self.__bucket( wall )
+            self.__buckets[ bucket ] = self.__buckets.get( bucket, 0 ) + 1
+            self.__runs += 1
+            if not ok:
+                self.__failures += 1
+
+            if timeout:
+                self.__timeouts += 1
+
+            self.__wall += wall
+            self.__cpu += cpu or 0.0
+            self.__max = max( self.__max, wall )
+            self.__last = wall
+
+        return
+
+    @property
+    def Runs( self ) -> int:
+        return self.__runs
+
+    @property
+    def Failures( self ) -> int:
+        return self.__failures
+
+    @property
+    def Timeouts( self ) -> int:
+        return self.__timeouts
+
+    @property
+    def WallTime( self ) -> float:
+        return self.__wall
+
+    @property
+    def CpuTime( self ) -> float:
+        return self.__cpu
+
+    @property
+    def Max( self ) -> float:
+        return self.__max
+
+    @property
+    def Last( self ) -> Optional[float]:
+        return self.__last
+
+    def percentile( self, percent: float ) -> Optional[float]:
+        """The upper bound of the bucket holding the percentile, None without runs"""
+        with self.__lock:
+            if self.__runs == 0:
+                return None
+
+            rank = math.ceil( self.__runs * percent / 100.0 )
+            count = 0
+            for bucket in sorted( self.__buckets ):
+                count += self.__buckets[ bucket ]
+                if count >= rank:
+                    return min( self.MINIMUM * self.GROWTH ** bucket, self.__max )
+
+        return self.__max
+
+    @property
+    def P50( self ) -> Optional[float]:
+        return self.percentile( 50 )
+
+    @property
+    def P95( self ) -> Optional[float]:
+        return self.percentile( 95 )
+
+    @property
+    def P99( self ) -> Optional[float]:
+        return self.percentile( 99 )
+
+    def info( self ) -> dict:
+        return {
+            'runs':         self.__runs,
+            'failures':     self.__failures,
+            'timeouts':     self.__timeouts,
+            'wall_time':    self.__wall,
+            'cpu_time':     self.__cpu,
+            'last':         self.__last,
+            'p50':          self.P50,
+            'p95':          self.P95,
+            'p99':          self.P99,
+            'max':          self.__max,
+        }
+
+    def __repr__( self ):
+        return f"<RunStatistics runs={self.__runs} p50={self.P50} p95={self.P95} p99={self.P99} max={self.__max}>"
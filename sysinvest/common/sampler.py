@@ -0,0 +1,289 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import Callable, Dict, List, Optional, Tuple, Any
+from collections import deque, namedtuple
+from types import MappingProxyType
+from threading import Thread, Event, Lock
+import time
+import logging
+import psutil
+
+
+Sample = namedtuple( 'Sample', [ 'timestamp', 'value' ] )
+
+
+def sampleCpu():
+    return tuple( psutil.cpu_percent( percpu = True ) )
+
+
+def sampleMemory():
+    mem = psutil.virtual_memory()
+    return ( mem.total, mem.available, mem.percent )
+
+
+def sampleNetwork():
+    counters = { iface: ( counter.bytes_recv, counter.bytes_sent )
+                 for iface, counter in psutil.net_io_counters( pernic = True ).items() }
+    total = psutil.net_io_counters()
+    counters[ 'Total' ] = ( total.bytes_recv, total.bytes_sent )
+    return MappingProxyType( counters )
+
+
+class HistoryView( object ):
+    """Read-only view on the samples of a source, oldest first"""
+    def __init__( self, source: 'SampledSource' ):
+        self.__source = source
+        return
+
+    @property
+    def Name( self ) -> str:
+        return self.__source.Name
+
+    @property
+    def Interval( self ) -> float:
+        """The current sample interval of the source"""
+        return self.__source.Interval
+
+    def latest( self ) -> Optional[Sample]:
+        return self.__source.latest()
+
+    def window( self, seconds: Optional[float] = None ) -> Tuple[ Sample, ... ]:
+        """The samples of the last 'seconds', all samples when None"""
+        return self.__source.window( seconds )
+
+    def __len__( self ):
+        return len( self.__source )
+
+
+class Subscription( object ):
+    def __init__( self, sampler: 'SamplerService', source: 'SampledSource', interval: float, retention: float,
+                  callback: Optional[Callable[ [Sample], None ]] = None ):
+        self.__sampler      = sampler
+        self.__source       = source
+        self.__interval     = interval
+        self.__retention    = retention
+        self.__callback     = callback
+        self.__view         = HistoryView( source )
+        return
+
+    def notify( self, sample: Sample ) -> None:
+        """Called on the sampler thread with each new sample of the source"""
+        if self.__callback is not None:
+            self.__callback( sample )
+
+        return
+
+    @property
+    def Interval( self ) -> float:
+        return self.__interval
+
+    @property
+    def Retention( self ) -> float:
+        return self.__retention
+
+    @property
+    def History( self ) -> HistoryView:
+        return self.__view
+
+    def close( self ) -> None:
+        self.__sampler.unsubscribe( self )
+        return
+
+
+class SampledSource( object ):
+    """A counter source with the subscriptions on it and its sample history"""
+    def __init__( self, name: str, function: Callable[ [], Any ] ):
+        self.__name         = name
+        self.__function     = function
+        self.__lock         = Lock()
+        self.__samples      = deque()
+        self.__subscriptions = []
+        self.__interval     = None
+        self.__retention    = 0
+        self.__due          = 0.0
+        return
+
+    @property
+    def Name( self ) -> str:
+        return self.__name
+
+    @property
+    def Interval( self ) -> Optional[float]:
+        return self.__interval
+
+    @property
+    def Due( self ) -> float:
+        return self.__due
+
+    @property
+    def Subscriptions( self ) -> List[ Subscription ]:
+        return self.__subscriptions
+
+    def __len__( self ):
+        return len( self.__samples )
+
+    def update( self ) -> None:
+        """The highest requested rate and the longest requested history are used"""
+        if len( self.__subscriptions ) == 0:
+            self.__interval = None
+            self.__retention = 0
+            with self.__lock:
+                self.__samples.clear()
+
+            return
+
+        self.__interval = min( subscription.Interval for subscription in self.__subscriptions )
+        self.__retention = max( subscription.Retention for subscription in self.__subscriptions )
+        self.__due = min( self.__due, time.monotonic() + self.__interval ) if self.__due else time.monotonic()
+        return
+
+    def sample( self, now: float ) -> None:
+        interval = self.__interval
+        if interval is None:
+            return
+
+        # Keep the pace, but never sample twice for a missed period
+        self.__due = max( self.__due + interval, now )
+        sample = Sample( time.time(), self.__function() )
+        with self.__lock:
+            self.__samples.append( sample )
+            while len( self.__samples ) > 0 and self.__samples[ 0 ].timestamp < sample.timestamp - self.__retention - interval:
+                self.__samples.popleft()
+
+            subscriptions = list( self.__subscriptions )
+
+        for subscription in subscriptions:
+            try:
+                subscription.notify( sample )
+
+            except Exception:
+                logging.getLogger( 'monitor' ).exception( f"Notifying a subscriber of {self.__name}" )
+
+        return
+
+    def latest( self ) -> Optional[Sample]:
+        with self.__lock:
+            return self.__samples[ -1 ] if len( self.__samples ) > 0 else None
+
+    def window( self, seconds: Optional[float] = None ) -> Tuple[ Sample, ... ]:
+        with self.__lock:
+            if seconds is None:
+                return tuple( self.__samples )
+
+            since = time.time() - seconds
+            return tuple( sample for sample in self.__samples if sample.timestamp >= since )
+
+
+class SamplerService( Thread ):
+    """Samples the system counters for all the plugins of the agent.
+
+    A plugin subscribes to a source with the interval and the history it needs.
+    Each source is sampled once per period at the highest requested rate, the
+    subscribers share the history through read-only views. Sources without
+    subscribers are not sampled.
+    """
+    SOURCES = {
+        'cpu':      sampleCpu,
+        'memory':   sampleMemory,
+        'network':  sampleNetwork,
+    }
+    __instance = None
+    __instanceLock = Lock()
+
+    def __init__( self ):
+        super().__init__( name = 'sampler', daemon = True )
+        self.log        = logging.getLogger( 'monitor' )
+        self.__event    = Event()
+        self.__wakeup   = Event()
+        self.__lock     = Lock()
+        self.__sources: Dict[ str, SampledSource ] = {}
+        return
+
+    @classmethod
+    def instance( cls ) -> 'SamplerService':
+        """The sampler of this process, started on first use"""
+        with cls.__instanceLock:
+            if cls.__instance is None or not cls.__instance.is_alive():
+                cls.__instance = cls()
+                cls.__instance.start()
+
+            return cls.__instance
+
+    def register( self, name: str, function: Callable[ [], Any ] ) -> None:
+        """Adds a counter source, the function returns the (immutable) sample value"""
+        with self.__lock:
+            if name not in self.__sources:
+                self.__sources[ name ] = SampledSource( name, function )
+
+        return
+
+    def subscribe( self, name: str, interval: float, retention: float = 60,
+                   callback: Optional[Callable[ [Sample], None ]] = None ) -> Subscription:
+        """Subscribes to a source, sampled at least every 'interval' seconds and
+        keeping at least 'retention' seconds of history. The callback is called
+        on the sampler thread with each new sample."""
+        with self.__lock:
+            source = self.__sources.get( name )
+            if source is None:
+                if name not in self.SOURCES:
+                    raise KeyError( f"No sampler source named '{name}'" )
+
+                source = self.__sources[ name ] = SampledSource( name, self.SOURCES[ name ] )
+
+            subscription = Subscription( self, source, interval, retention, callback )
+            source.Subscriptions.append( subscription )
+            source.update()
+
+        self.__wakeup.set()
+        return subscription
+
+    def unsubscribe( self, subscription: Subscription ) -> None:
+        with self.__lock:
+            for source in self.__sources.values():
+                if subscription in source.Subscriptions:
+                    source.Subscriptions.remove( subscription )
+                    source.update()
+
+        return
+
+    def stop( self ) -> None:
+        self.__event.set()
+        self.__wakeup.set()
+        return
+
+    def run( self ) -> None:
+        while not self.__event.is_set():
+            now = time.monotonic()
+            with self.__lock:
+                sources = [ source for source in self.__sources.values() if source.Interval is not None ]
+
+            for source in sources:
+                if source.Due <= now:
+                    try:
+                        source.sample( now )
+
+                    except Exception:
+                        self.log.exception( f"Sampling {source.Name}" )
+
+            sleep = min( [ source.Due for source in sources ], default = now + 60 ) - time.monotonic()
+            self.__wakeup.wait( max( 0.0, sleep ) )
+            self.__wakeup.clear()
+
+        return
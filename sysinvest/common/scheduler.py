@@ -0,0 +1,332 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import List, Optional, Set
+import time
+import hashlib
+import heapq
+import itertools
+import logging
+from functools import lru_cache
+from datetime import datetime, timedelta
+from sysinvest.common.plugin import MonitorPlugin
+from sysinvest.common.runstats import RunStatistics
+
+
+MONTH_NAMES = { 'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+                'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12 }
+DAY_NAMES   = { 'sun': 0, 'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6 }
+
+CATCHUP_ONCE    = 'once'
+CATCHUP_SKIP    = 'skip'
+JITTER_AUTO     = 'auto'
+
+
+def _parseField( text: str, low: int, high: int, names: Optional[dict] = None ) -> Set[int]:
+    def value( item: str ) -> int:
+        item = item.lower()
+        if names is not None and item in names:
+            return names[ item ]
+
+        return int( item )
+
+    result = set()
+    for part in text.split( ',' ):
+        step = None
+        if '/' in part:
+            part, step = part.split( '/', 1 )
+            step = int( step )
+            if step < 1:
+                raise ValueError( f"Invalid step in cron field '{text}'" )
+
+        if part in ( '*', '?' ):
+            start, end = low, high
+
+        elif '-' in part:
+            start, end = ( value( item ) for item in part.split( '-', 1 ) )
+
+        else:
+            start = value( part )
+            end = high if step is not None else start
+
+        if start < low or end > high or start > end:
+            raise ValueError( f"Cron field '{text}' out of range {low}-{high}" )
+
+        result.update( range( start, end + 1, step or 1 ) )
+
+    return result
+
+
+class CronSchedule( object ):
+    """Compiled cron expression.
+
+    Supports the classic 5 fields 'minute hour day month weekday' and
+    6 fields where the first field contains the seconds.
+    """
+    def __init__( self, expression: str ):
+        self.__expression = expression
+        fields = expression.split()
+        if len( fields ) == 5:
+            fields.insert( 0, '0' )
+
+        elif len( fields ) != 6:
+            raise ValueError( f"Invalid cron expression '{expression}'" )
+
+        self.__seconds  = sorted( _parseField( fields[ 0 ], 0, 59 ) )
+        self.__minutes  = _parseField( fields[ 1 ], 0, 59 )
+        self.__hours    = _parseField( fields[ 2 ], 0, 23 )
+        self.__days     = _parseField( fields[ 3 ], 1, 31 )
+        self.__months   = _parseField( fields[ 4 ], 1, 12, MONTH_NAMES )
+        # Both 0 and 7 are Sunday
+        self.__weekdays = { day % 7 for day in _parseField( fields[ 5 ], 0, 7, DAY_NAMES ) }
+        self.__anyDay   = fields[ 3 ] in ( '*', '?' )
+        self.__anyWeekday = fields[ 5 ] in ( '*', '?' )
+        self.__interval = None
+        return
+
+    @property
+    def Expression( self ) -> str:
+        return self.__expression
+
+    @property
+    def Interval( self ) -> float:
+        """The shortest time in seconds between two fires"""
+        if self.__interval is None:
+            fire = self.next( datetime.now() )
+            intervals = []
+            for _ in range( 4 ):
+                following = self.next( fire )
+                intervals.append( ( following - fire ).total_seconds() )
+                fire = following
+
+            self.__interval = min( intervals )
+
+        return self.__interval
+
+    def __matchDay( self, current: datetime ) -> bool:
+        # Python weekday() has Monday as 0, cron has Sunday as 0
+        weekday = ( current.weekday() + 1 ) % 7
+        if self.__anyDay:
+            return weekday in self.__weekdays
+
+        if self.__anyWeekday:
+            return current.day in self.__days
+
+        # When both are restricted, cron fires when either one matches
+        return current.day in self.__days or weekday in self.__weekdays
+
+    def next( self, after: datetime ) -> datetime:
+        """The first fire time after the given time"""
+        current = after.replace( microsecond = 0 ) + timedelta( seconds = 1 )
+        limit = current.year + 5
+        while current.year <= limit:
+            if current.month not in self.__months:
+                current = ( current.replace( day = 1, hour = 0, minute = 0, second = 0 ) + timedelta( days = 32 ) ).replace( day = 1 )
+                continue
+
+            if not self.__matchDay( current ):
+                current = current.replace( hour = 0, minute = 0, second = 0 ) + timedelta( days = 1 )
+                continue
+
+            if current.hour not in self.__hours:
+                current = current.replace( minute = 0, second = 0 ) + timedelta( hours = 1 )
+                continue
+
+            if current.minute not in self.__minutes:
+                current = current.replace( second = 0 ) + timedelta( minutes = 1 )
+                continue
+
+            for second in self.__seconds:
+                if second >= current.second:
+                    return current.replace( second = second )
+
+            current = current.replace( second = 0 ) + timedelta( minutes = 1 )
+
+        raise ValueError( f"Cron expression '{self.__expression}' never fires" )
+
+    def __repr__( self ):
+        return f"<CronSchedule '{self.__expression}'>"
+
+
+@lru_cache( maxsize = None )
+def compileCron( expression: str ) -> CronSchedule:
+    return CronSchedule( expression )
+
+
+class ScheduleEntry( object ):
+    def __init__( self, task: MonitorPlugin, due: float, fire: datetime, offset: float ):
+        self.task       = task
+        self.due        = due
+        self.fire       = fire
+        self.offset     = offset
+        self.valid      = True
+        return
+
+
+class TaskScheduler( object ):
+    """Min-heap of the monotonic next fire times of the tasks.
+
+    The cron expressions are compiled once, the monitor only needs to sleep until
+    the first entry is due. When a task is late, all the fires it missed are
+    coalesced, by default into one run ('once'). With the 'skip' policy a fire
+    later than 'grace' seconds is not executed, the task is rescheduled for its
+    next fire time.
+
+    Tasks sharing a cron slot are spread over the interval of the slot, each task
+    starts with a fixed offset derived from a hash of its name. The offset is
+    limited by the 'jitter' seconds of the object, by default ('auto') the
+    interval of the cron expression up to 'max_jitter' seconds.
+
+    A task with an 'adaptive' interval skips cron fires while it is stable, the
+    next fire is delayed by ( IntervalFactor - 1 ) cron intervals, limited by the
+    'max_interval' of the task.
+    """
+    def __init__( self, catchup: str = CATCHUP_ONCE, grace: float = 60, jitter = JITTER_AUTO, max_jitter: float = 300 ):
+        self.log            = logging.getLogger( 'monitor' )
+        self.__heap         = []
+        self.__entries      = {}
+        self.__sequence     = itertools.count()
+        self.__catchup      = catchup
+        self.__grace        = grace
+        self.__jitter       = jitter
+        self.__maxJitter    = max_jitter
+        self.__lateness     = RunStatistics()
+        return
+
+    @property
+    def Lateness( self ) -> RunStatistics:
+        """How late the due tasks were popped, a measure for the overrun of the monitor loop"""
+        return self.__lateness
+
+    def __len__( self ):
+        return len( self.__entries )
+
+    def __contains__( self, task: MonitorPlugin ):
+        return id( task ) in self.__entries
+
+    def offset( self, task: MonitorPlugin, cron: CronSchedule ) -> float:
+        """The deterministic start delay of the task within the interval of its cron slot"""
+        jitter = task.Config.get( 'jitter', self.__jitter )
+        if jitter == JITTER_AUTO:
+            spread = min( cron.Interval, self.__maxJitter )
+
+        else:
+            spread = float( jitter or 0 )
+
+        # The task must start before the next fire of the slot
+        spread = min( spread, cron.Interval - 1 )
+        if spread <= 0:
+            return 0.0
+
+        digest = hashlib.md5( task.Name.encode( 'utf-8' ) ).digest()
+        return spread * int.from_bytes( digest[ :8 ], 'big' ) / 2 ** 64
+
+    def stretch( self, task: MonitorPlugin, cron: CronSchedule ) -> float:
+        """Seconds the next fire of an adaptive task is delayed"""
+        adaptive = task.Adaptive
+        if adaptive is None or task.IntervalFactor <= 1:
+            return 0.0
+
+        return max( 0.0, min( ( task.IntervalFactor - 1 ) * cron.Interval,
+                              float( adaptive[ 'max_interval' ] ) - cron.Interval ) )
+
+    def __push( self, task: MonitorPlugin, fire: datetime, now: float, nowWall: datetime, offset: float = 0.0 ) -> ScheduleEntry:
+        entry = ScheduleEntry( task, now + ( fire - nowWall ).total_seconds() + offset, fire, offset )
+        self.__entries[ id( task ) ] = entry
+        heapq.heappush( self.__heap, ( entry.due, next( self.__sequence ), entry ) )
+        return entry
+
+    def add( self, task: MonitorPlugin, immediate: bool = False ) -> None:
+        """Schedule the task on its next fire time, or right now"""
+        self.remove( task )
+        nowWall = datetime.now()
+        if immediate:
+            self.__push( task, nowWall, time.monotonic(), nowWall )
+            return
+
+        try:
+            cron = compileCron( task.Cron )
+            offset = self.offset( task, cron )
+            # The previous fire may still be due when its offset did not pass yet
+            fire = cron.next( nowWall - timedelta( seconds = offset ) )
+
+        except ValueError:
+            self.log.error( f"{task.Name} has an invalid cron expression '{task.Cron}', not scheduled" )
+            return
+
+        self.__push( task, fire, time.monotonic(), nowWall, offset )
+        return
+
+    def remove( self, task: MonitorPlugin ) -> None:
+        entry = self.__entries.pop( id( task ), None )
+        if entry is not None:
+            # Lazy delete, the entry is dropped when it reaches the top of the heap
+            entry.valid = False
+
+        return
+
+    def reschedule( self, task: MonitorPlugin ) -> None:
+        """Schedule the task on its next fire time after now"""
+        self.add( task )
+        return
+
+    def timeUntilNext( self ) -> Optional[float]:
+        while len( self.__heap ) > 0 and not self.__heap[ 0 ][ 2 ].valid:
+            heapq.heappop( self.__heap )
+
+        if len( self.__heap ) == 0:
+            return None
+
+        return max( 0.0, self.__heap[ 0 ][ 0 ] - time.monotonic() )
+
+    def catchup( self, task: MonitorPlugin ) -> str:
+        return task.Config.get( 'catchup', self.__catchup )
+
+    def pop( self ) -> List[ MonitorPlugin ]:
+        """Returns the tasks that are due and schedules their next fire"""
+        result = []
+        now = time.monotonic()
+        nowWall = datetime.now()
+        while len( self.__heap ) > 0 and self.__heap[ 0 ][ 0 ] <= now:
+            _, _, entry = heapq.heappop( self.__heap )
+            if not entry.valid:
+                continue
+
+            task = entry.task
+            late = now - entry.due
+            self.__lateness.record( max( 0.0, late ), None, True )
+            try:
+                cron = compileCron( task.Cron )
+                offset = self.offset( task, cron )
+                # All fires between the entry and now are coalesced into this run
+                fire = cron.next( max( entry.fire, nowWall - timedelta( seconds = offset ) ) +
+                                  timedelta( seconds = self.stretch( task, cron ) ) )
+                self.__push( task, fire, now, nowWall, offset )
+
+            except ValueError:
+                self.log.error( f"{task.Name} has an invalid cron expression '{task.Cron}', not scheduled" )
+                del self.__entries[ id( task ) ]
+
+            if late > self.__grace and self.catchup( task ) == CATCHUP_SKIP:
+                self.log.warning( f"{task.Name} skipped, {late:.1f} seconds late" )
+                continue
+
+            result.append( task )
+
+        return result
@@ -0,0 +1,276 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+from typing import Iterable, List, Optional, Union
+import time
+import bisect
+import hashlib
+import logging
+import multiprocessing
+from queue import Empty
+from threading import Thread, Event
+from sysinvest.common.plugin import MonitorPlugin, PluginResult, PluginResultBatch
+from sysinvest.common.isolation import serializeResult, deserializeResult, IsolatedParent
+from sysinvest.common.configuration import ConfigLoader
+from sysinvest.common.fanout import FanOut
+import sysinvest.common.api as API
+
+
+class HashRing( object ):
+    """Consistent hashing of the object names on the worker processes.
+
+    Each node is placed 'replicas' times on the ring, an object belongs to the
+    first node following the hash of its name. Adding or removing a node only
+    moves the objects of about 1/N of the ring.
+    """
+    def __init__( self, nodes: Iterable[str] = (), replicas: int = 128 ):
+        self.__replicas = replicas
+        self.__keys     = []
+        self.__ring     = {}
+        self.__nodes    = []
+        for node in nodes:
+            self.add( node )
+
+        return
+
+    @staticmethod
+    def hash( key: str ) -> int:
+        return int.from_bytes( hashlib.md5( key.encode( 'utf-8' ) ).digest()[ :8 ], 'big' )
+
+    @property
+    def Nodes( self ) -> List[str]:
+        return list( self.__nodes )
+
+    def add( self, node: str ) -> None:
+        self.__nodes.append( node )
+        for replica in range( self.__replicas ):
+            key = self.hash( f"{node}#{replica}" )
+            self.__ring[ key ] = node
+            bisect.insort( self.__keys, key )
+
+        return
+
+    def remove( self, node: str ) -> None:
+        self.__nodes.remove( node )
+        for replica in range( self.__replicas ):
+            key = self.hash( f"{node}#{replica}" )
+            del self.__ring[ key ]
+            self.__keys.remove( key )
+
+        return
+
+    def node( self, name: str ) -> Optional[str]:
+        if len( self.__keys ) == 0:
+            return None
+
+        index = bisect.bisect( self.__keys, self.hash( name ) ) % len( self.__keys )
+        return self.__ring[ self.__keys[ index ] ]
+
+
+def workerNames( workers: int ) -> List[str]:
+    return [ f"worker-{index}" for index in range( workers ) ]
+
+
+class ShardQueue( object ):
+    """Replaces API.QUEUE in a worker process, forwards the results to the supervisor"""
+    def __init__( self, queue: multiprocessing.Queue, index: int ):
+        self.__queue = queue
+        self.__index = index
+        return
+
+    def put( self, result: Union[ PluginResult, PluginResultBatch ], block: bool = True, timeout: Optional[float] = None ) -> None:
+        plugin = result.Plugin
+        statistics = getattr( plugin, 'Statistics', None )
+        self.__queue.put( ( self.__index,
+                            plugin.Name,
+                            getattr( plugin, 'HitCounter', 0 ),
+                            statistics.info() if statistics is not None else {},
+                            plugin.Parent.info(),
+                            serializeResult( result ) ), block, timeout )
+        return
+
+    def put_nowait( self, result: Union[ PluginResult, PluginResultBatch ] ) -> None:
+        self.put( result, False )
+        return
+
+    def qsize( self ) -> int:
+        try:
+            return self.__queue.qsize()
+
+        except NotImplementedError:
+            return 0
+
+
+def _shardMain( index: int, workers: int, config_files: tuple, queue: multiprocessing.Queue ) -> None:
+    """Main of a worker process, runs the monitor on the objects of its shard"""
+    from sysinvest.common.monitor import Monitor
+    ring = HashRing( workerNames( workers ) )
+    node = workerNames( workers )[ index ]
+    configuration = ConfigLoader( *config_files )
+    while configuration.isLoading:
+        time.sleep( 1 )
+
+    API.QUEUE = ShardQueue( queue, index )
+    monitor = Monitor( configuration, shard = lambda name: ring.node( name ) == node )
+    try:
+        monitor.run()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        configuration.stop()
+
+    return
+
+
+class MirroredStatistics( object ):
+    def __init__( self ):
+        self.__info = {}
+        return
+
+    def update( self, info: dict ) -> None:
+        self.__info = info
+        return
+
+    def info( self ) -> dict:
+        return dict( self.__info )
+
+
+class ShardedTask( MonitorPlugin ):
+    """Stands in the supervisor for a task that runs in a worker process,
+    the hit counter and the statistics are mirrored from the worker"""
+    def __init__( self, parent, config: dict ):
+        super().__init__( parent, config )
+        self.__hits = 0
+        self.__statistics = MirroredStatistics()
+        return
+
+    @property
+    def Statistics( self ) -> MirroredStatistics:
+        return self.__statistics
+
+    @property
+    def HitCounter( self ) -> int:
+        return self.__hits
+
+    def mirror( self, hits: int, statistics: dict ) -> None:
+        self.__hits = hits
+        self.__statistics.update( statistics )
+        return
+
+    def hitsReached( self ) -> bool:
+        return self.Hits <= self.__hits
+
+
+class Supervisor( object ):
+    """Runs the objects in 'workers' processes, the objects are assigned on the
+    consistent hash of their name. The results of the workers are merged into
+    API.QUEUE of the supervisor, so a single collector reports them all.
+    """
+    def __init__( self, configuration: ConfigLoader, workers: int, config_files: tuple ):
+        self.log            = logging.getLogger( 'monitor' )
+        self.__cfgClass     = configuration
+        self.__workers      = workers
+        self.__configFiles  = config_files
+        self.__context      = multiprocessing.get_context( 'spawn' )
+        self.__queue        = self.__context.Queue()
+        self.__processes    = [ None ] * workers
+        self.__parents      = [ IsolatedParent() for _ in range( workers ) ]
+        self.__tasks        = {}
+        self.__objects      = {}
+        self.__fanOut       = FanOut()
+        self.__updateIndex  = None
+        self.__event        = Event()
+        self.__receiver     = Thread( target = self.__receive, name = 'supervisor', daemon = True )
+        return
+
+    def __start( self, index: int ) -> None:
+        process = self.__context.Process( target = _shardMain, name = f"sysinvest-worker-{index}",
+                                          args = ( index, self.__workers, self.__configFiles, self.__queue ) )
+        process.start()
+        self.__processes[ index ] = process
+        self.log.info( f"Started worker {index}, pid {process.pid}" )
+        return
+
+    def __task( self, index: int, name: str ) -> ShardedTask:
+        if self.__updateIndex != self.__cfgClass.UpdateIndex:
+            self.__updateIndex = self.__cfgClass.UpdateIndex
+            self.__objects = { obj.get( 'name' ): obj for obj in self.__fanOut.expand( self.__cfgClass.Configuration.get( 'objects', [] ) ) }
+
+        obj = self.__objects.get( name, { 'name': name } )
+        task = self.__tasks.get( name )
+        if task is None:
+            task = self.__tasks[ name ] = ShardedTask( self.__parents[ index ], obj )
+
+        elif task.Config is not obj:
+            task.configure( obj )
+
+        return task
+
+    def __receive( self ) -> None:
+        while not self.__event.is_set():
+            try:
+                index, name, hits, statistics, info, data = self.__queue.get( timeout = 1 )
+
+            except Empty:
+                continue
+
+            except ( EOFError, OSError ):
+                break
+
+            try:
+                self.__parents[ index ].update( info )
+                task = self.__task( index, name )
+                task.mirror( hits, statistics )
+                API.QUEUE.put( deserializeResult( task, data ) )
+
+            except Exception:
+                self.log.exception( f"Receiving the result of {name} from worker {index}" )
+
+        return
+
+    def run( self ) -> None:
+        self.__receiver.start()
+        for index in range( self.__workers ):
+            self.__start( index )
+
+        try:
+            while not self.__event.is_set():
+                for index, process in enumerate( self.__processes ):
+                    if not process.is_alive():
+                        self.log.error( f"Worker {index} exited with {process.exitcode}, restarting" )
+                        self.__start( index )
+
+                self.__event.wait( 5 )
+
+        finally:
+            self.stop()
+            # On an interrupt the workers stop by themselves, otherwise they are terminated
+            deadline = time.monotonic() + 10
+            for process in self.__processes:
+                process.join( max( 0.0, deadline - time.monotonic() ) )
+                if process.is_alive():
+                    process.terminate()
+
+        return
+
+    def stop( self ) -> None:
+        self.__event.set()
+        return
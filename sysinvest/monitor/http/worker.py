@@ -17,6 +17,7 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
+from urllib.parse import urlparse
 from sysinvest.common.plugin import MonitorPlugin, PluginResult
 import traceback
 import sysinvest.common.plugin.constants as const
@@ -25,6 +26,9 @@ import sysinvest.common.api as API
 
 
 class Http( MonitorPlugin ):
+    def defaultConcurrencyKey( self ):
+        return urlparse( self.Attributes.get( 'url', 'http://localhost' ) ).hostname
+
     def execute( self ) -> bool:
         super().execute()
         task_result = PluginResult( self )
@@ -18,6 +18,7 @@
 #   Boston, MA 02110-1301 USA
 #
 import os
+from urllib.parse import urlparse
 from sysinvest.common.plugin import MonitorPlugin, PluginResult
 import traceback
 import sysinvest.common.plugin.constants as const
@@ -56,6 +57,9 @@ def checkCertKey( cert, key, result ):
 
 
 class Https( MonitorPlugin ):
+    def defaultConcurrencyKey( self ):
+        return urlparse( self.Attributes.get( 'url', 'http://localhost' ) ).hostname
+
     def execute( self ) -> bool:
         super().execute()
         task_result = PluginResult( self )
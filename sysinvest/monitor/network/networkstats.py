@@ -17,11 +17,9 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
-from typing import List, Union, Optional
-import psutil
-import time
+from typing import Callable, List, Union, Optional
 import statistics
-from threading import Event, Thread, RLock
+from sysinvest.common.sampler import SamplerService
 from sysinvest.common.bytesizes import sizeof2shorthand, shorthand2sizeof
 
 
@@ -62,8 +60,8 @@ class NetworkData( object ):
         print( f"iface: { self.__interface }" )
         print( f"  Download:       { sizeof2shorthand( self.__rxBytes ) }" )
         print( f"  Upload:         { sizeof2shorthand( self.__txBytes ) }" )
-        print( f"  Upload Speed:   { sizeof2shorthand( self.__rxSpeed / self.__update_delay ) }/s" )
-        print( f"  Download Speed: { sizeof2shorthand( self.__txSpeed / self.__update_delay ) }/s" )
+        print( f"  Download Speed: { sizeof2shorthand( self.__rxSpeed / self.__update_delay ) }/s" )
+        print( f"  Upload Speed:   { sizeof2shorthand( self.__txSpeed / self.__update_delay ) }/s" )
         return
 
     @property
@@ -107,22 +105,31 @@ class FoundNetworkItem( Exception ):
         return
 
 
-class NetworkInfo( Thread ):
-    def __init__( self, interval: Optional[Union[int,float]] = 1 ):
-        super().__init__()
-        self.__list = []
+class NetworkInfo( object ):
+    """The network counters per interface, sampled by the shared sampler of the agent.
+
+    The speeds are in bytes per second, the average speeds over the last minute.
+    """
+    def __init__( self, interval: Optional[Union[int,float]] = 1, callback: Optional[Callable] = None ):
         self.__interval = interval
-        self.__event = Event()
-        self.__lock = RLock()
-        self.__history = {}
+        self.__callback = callback
+        self.__network = None
+        return
+
+    def start( self ) -> None:
+        self.__network = SamplerService.instance().subscribe( 'network', self.__interval, retention = 60,
+                                                                 callback = self.__callback )
         return
 
     def stop( self ) -> None:
-        self.__event.set()
+        if self.__network is not None:
+            self.__network.close()
+            self.__network = None
+
         return
 
     def dump( self, iface: Optional[str] = None ) -> None:
-        for item in self.__list:
+        for item in self.getLoadData():
             if iface is None:
                 item.dump()
 
@@ -132,89 +139,38 @@ class NetworkInfo( Thread ):
 
         return
 
-    def __update( self, iface: str, bytes_recv: int, bytes_sent: int, upload_speed: int, download_speed: int, update_delay: int ) -> None:
-        self.__lock.acquire()
-        item = None
-        try:
-            for item in self.__list:
-                if item.Interface == iface:
-                    raise FoundNetworkItem( item )
-
-            # Not found, so we add it
-            item = NetworkData( iface, bytes_recv, bytes_sent, upload_speed, download_speed, update_delay )
-            self.__list.append( item )
-
-        except FoundNetworkItem as data:
-            # Update the existing item
-            item = data.data
-            item.set( bytes_recv, bytes_sent, upload_speed, download_speed )
-
-        finally:
-            if isinstance( item, NetworkData ):
-                # Add it to the history per adaptor
-                self.__history.setdefault( iface, [] ).append( NetworkData( item ) )
-
-            # Check that the history contains NO more that a minute of data
-            for iface in list( self.__history.keys() ):
-                if len( self.__history[ iface ] ) > int( 60 / self.__interval ):
-                    del self.__history[ iface ][ 0 ]
-
-            self.__lock.release()
-
-        return
-
-    def run( self ) -> None:
-        st = time.time()
-        measure_nic_start = psutil.net_io_counters( pernic = True )
-        measure_total_start = psutil.net_io_counters()
-        while not self.__event.is_set():
-            # Calculate the time we need to sleep to be at 'interval'
-            sleep = self.__interval - ( time.time() - st )
-            self.__event.wait( sleep )
-            st = time.time()
-
-            # get the network I/O stats again per interface
-            measure_nic_end = psutil.net_io_counters( pernic = True )
-            measure_total_end = psutil.net_io_counters()
-            # initialize the data to gather (a list of dicts)
-            for ( iface, iface_start ), ( iface2, iface_end ) in zip( measure_nic_start.items(), measure_nic_end.items() ):
-                # start - end stats gets us the speed
-                self.__update( iface, iface_end.bytes_recv, iface_end.bytes_sent,
-                               iface_end.bytes_sent - iface_start.bytes_sent,
-                               iface_end.bytes_recv - iface_start.bytes_recv, self.__interval )
-
-            # start - end stats gets us the speed
-            self.__update( 'Total', measure_total_end.bytes_recv, measure_total_end.bytes_sent,
-                           measure_total_end.bytes_sent - measure_total_start.bytes_sent,
-                           measure_total_end.bytes_recv - measure_total_start.bytes_recv,
-                           self.__interval )
-
-            # update the I/O stats for the next iteration
-            measure_nic_start = measure_nic_end
-            measure_total_start = measure_total_end
-
-        self.__event.clear()
-        return
-
     def getLoadData( self ) -> List[NetworkData]:
         data = []
-        self.__lock.acquire()
-        try:
-            averages = {}
-            # Calculate the average speeds for all interfaces
-            for iface, history in self.__history.items():
-                hist: NetworkData
-                rxSpeed = [ hist.ReceiveSpeed for hist in history if isinstance( hist.ReceiveSpeed, int ) ]
-                txSpeed = [ hist.TransmitSpeed for hist in history if isinstance( hist.TransmitSpeed, int ) ]
-                averages[ iface ] = ( statistics.mean( rxSpeed ), statistics.mean( txSpeed ) )
-
-            for item in self.__list:
-                # Copy the interface data and add the average speeds
-                newItem = NetworkData( item )
-                newItem.setAverage( *averages[ item.Interface ] )
-                data.append( newItem )
-
-        finally:
-            self.__lock.release()
+        if self.__network is None:
+            return data
+
+        history = self.__network.History.window( 60 )
+        if len( history ) < 2:
+            return data
+
+        speeds = {}
+        for previous, current in zip( history, history[ 1: ] ):
+            delay = current.timestamp - previous.timestamp
+            if delay <= 0:
+                continue
+
+            for iface, ( rx, tx ) in current.value.items():
+                if iface not in previous.value:
+                    continue
+
+                prevRx, prevTx = previous.value[ iface ]
+                # A counter that was reset gives no speed for this period
+                speeds.setdefault( iface, [] ).append( ( max( 0, rx - prevRx ) / delay,
+                                                         max( 0, tx - prevTx ) / delay ) )
+
+        for iface, ( rx, tx ) in history[ -1 ].value.items():
+            if iface not in speeds:
+                continue
+
+            rxSpeed, txSpeed = speeds[ iface ][ -1 ]
+            item = NetworkData( iface, rx, tx, int( rxSpeed ), int( txSpeed ), 1 )
+            item.setAverage( statistics.mean( speed[ 0 ] for speed in speeds[ iface ] ),
+                             statistics.mean( speed[ 1 ] for speed in speeds[ iface ] ) )
+            data.append( item )
 
         return data
@@ -1,16 +1,20 @@
-from sysinvest.common.plugin import MonitorPlugin, PluginResult
-import sysinvest.common.api as API
+from typing import Optional
+from sysinvest.common.plugin import StreamingMonitorPlugin, PluginResult
 from sysinvest.monitor.network.networkstats import NetworkData, NetworkInfo
 from sysinvest.common.bytesizes import sizeof2shorthand, shorthand2sizeof
+import asyncio
 import socket
 
 
-class NetworkMonitor( MonitorPlugin ):
+class NetworkMonitor( StreamingMonitorPlugin ):
     DEFAULT_TEMPLATE = """${message}
 """
     def __init__( self, parent, obj  ):
         super().__init__( parent, obj )
-        self.__thread = NetworkInfo( interval = 5 )
+        # The reverse DNS lookups are done by the scheduled execute(), the
+        # evaluations of the samples in between use the last lookups
+        self.__fqdns = {}
+        self.__thread = NetworkInfo( interval = 5, callback = self.changed )
         self.__thread.start()
         return
 
@@ -19,55 +23,65 @@ class NetworkMonitor( MonitorPlugin ):
         self.__thread.stop()
         return
 
-    def execute( self ) -> bool:
-        task_result = PluginResult( self )
+    def evaluate( self ) -> Optional[PluginResult]:
         netInfo = self.__thread.getLoadData()
-        if isinstance( netInfo, list ) and len( netInfo ) > 0:
-            messages = []
-            errors = []
-            netOk   = True
-            interfaces = self.Attributes.get( 'interfaces', [] )
-            for interface in interfaces:
-                iface       = interface.get( 'interface' )
-                address     = interface.get( 'address' )
-                hostname    = interface.get( 'hostname' )
-
-                if address is not None and hostname is not None:
-                    if socket.getfqdn( address ) != hostname:
-                        errors.append( f"{iface} has a WRONG IP address {address}/hostname {socket.getfqdn( address )} should be {hostname}")
-                        netOk   = False
-
-                media = interface.get( 'media' )
-                threshold = interface.get( 'threshold' )
-                if media is not None and threshold is not None:
-                    if isinstance( media, (int,str) ):
-                        media = shorthand2sizeof( media )
-
-                    max_media = media * (threshold/100)
-                    for net in netInfo:
-                        if net.Interface == iface:
-                            if net.ReceiveSpeed > max_media:
-                                errors.append( f"the rx-Speed exceeds the threshold: {net.ReceiveSpeed} >= {threshold}%" )
-                                netOk   = False
-
-                            if net.TransmitSpeed > max_media:
-                                errors.append( f"the tx-Speed exceeds the threshold: {net.TransmitSpeed} >= {threshold}%" )
-                                netOk   = False
-
-                            messages.append( f"{iface} Received: {net.ReceiveBytes}  Transmitted: {net.TransmitBytes}  Rx-Speed: {net.AverageReceiveSpeed}  Tx-Speed: {net.AverageTransmitSpeed}" )
-
-            if len( messages ) == 0:
-                messages.append( "Network loads normal" )
-
-            if netOk:
-                task_result.update( netOk, '\n'.join( messages ), netInfo = netInfo )
-
-            else:
-                task_result.update( netOk, "{}\n{}".format( '\n'.join( errors ), '\n'.join( messages ) ), netInfo = netInfo )
+        if not isinstance( netInfo, list ) or len( netInfo ) == 0:
+            return None
+
+        task_result = PluginResult( self )
+        messages = []
+        errors = []
+        netOk   = True
+        for interface in self.Attributes.get( 'interfaces', [] ):
+            iface       = interface.get( 'interface' )
+            address     = interface.get( 'address' )
+            hostname    = interface.get( 'hostname' )
+
+            if address is not None and hostname is not None and address in self.__fqdns:
+                if self.__fqdns[ address ] != hostname:
+                    errors.append( f"{iface} has a WRONG IP address {address}/hostname {self.__fqdns[ address ]} should be {hostname}")
+                    netOk   = False
+
+            media = interface.get( 'media' )
+            threshold = interface.get( 'threshold' )
+            if media is not None and threshold is not None:
+                if isinstance( media, (int,str) ):
+                    media = shorthand2sizeof( media )
+
+                max_media = media * (threshold/100)
+                for net in netInfo:
+                    if net.Interface == iface:
+                        if net.ReceiveSpeed > max_media:
+                            errors.append( f"the rx-Speed exceeds the threshold: {net.ReceiveSpeed} >= {threshold}%" )
+                            netOk   = False
+
+                        if net.TransmitSpeed > max_media:
+                            errors.append( f"the tx-Speed exceeds the threshold: {net.TransmitSpeed} >= {threshold}%" )
+                            netOk   = False
+
+                        messages.append( f"{iface} Received: {net.ReceiveBytes}  Transmitted: {net.TransmitBytes}  Rx-Speed: {net.AverageReceiveSpeed}  Tx-Speed: {net.AverageTransmitSpeed}" )
+
+        if len( messages ) == 0:
+            messages.append( "Network loads normal" )
+
+        if netOk:
+            task_result.update( netOk, '\n'.join( messages ), netInfo = netInfo )
 
         else:
-            task_result.update( True, "Collecting", memInfo = [] )
+            task_result.update( netOk, "{}\n{}".format( '\n'.join( errors ), '\n'.join( messages ) ), netInfo = netInfo )
+
+        return task_result
 
-        API.QUEUE.put( task_result )
-        return task_result.Result
+    async def execute( self ) -> bool:
+        interfaces = self.Attributes.get( 'interfaces', [] )
+        # Do the reverse DNS lookups of all interfaces at the same time
+        addresses = [ interface.get( 'address' ) for interface in interfaces
+                      if interface.get( 'address' ) is not None and interface.get( 'hostname' ) is not None ]
+        self.__fqdns = dict( zip( addresses, await asyncio.gather( *[ self.runBlocking( socket.getfqdn, address )
+                                                                      for address in addresses ] ) ) )
+        task_result = self.evaluate()
+        if task_result is None:
+            task_result = PluginResult( self )
+            task_result.update( True, "Collecting", memInfo = [] )
 
+        return self.heartbeat( task_result )
@@ -19,7 +19,7 @@
 #
 import os
 import shutil
-from sysinvest.common.plugin import MonitorPlugin, PluginResult
+from sysinvest.common.plugin import MonitorPlugin, PluginResult, PluginResultBatch
 import sysinvest.common.api as API
 from sysinvest.common.bytesizes import shorthand2sizeof, sizeof2shorthand
 
@@ -72,10 +72,35 @@ def checkFileSystem( fs, result, messages ):
 
 
 class FileSystemMonitor( MonitorPlugin ):
+    def executeBatch( self, filesystems: list ) -> bool:
+        """A result per filesystem, each with its own status and hit counter"""
+        batch = PluginResultBatch( self )
+        for fs in filesystems:
+            task_result = batch.add( fs.get( 'filesystem' ) )
+            try:
+                result = []
+                messages = []
+                checkFileSystem( fs, result, messages )
+                if len( result ) == 0:
+                    task_result.update( True, "Filesystem OK: \n{}".format( "\n".join( messages ) ) )
+
+                else:
+                    task_result.update( False, "Filesystem NOK: \n{}".format( "\n".join( result ) ) )
+
+            except Exception as exc:
+                self.log.exception( "in FileSystemMonitor" )
+                task_result.update( False, f"{exc}" )
+
+        API.QUEUE.put( batch )
+        return batch.Result
+
     def execute( self ) -> bool:
         super().execute()
-        task_result = PluginResult(self)
         filesystem = self.Attributes.get( 'filesystem' )
+        if isinstance( filesystem, list ) and self.Attributes.get( 'per_filesystem', False ):
+            return self.executeBatch( filesystem )
+
+        task_result = PluginResult(self)
         self.log.info( f"Checking filesystem: {filesystem}" )
         try:
             result = []
@@ -80,6 +80,17 @@ class RedisMonitor( MonitorPlugin ):
                                                 )
         return
 
+    def defaultConcurrencyKey( self ):
+        return self.Attributes.get( 'host', 'localhost' )
+
+    def reconfigure( self, config: dict ) -> bool:
+        # The connection pool is built from the configuration, rebuild the plugin
+        return False
+
+    def stop( self ):
+        self.__redisPool.disconnect()
+        return
+
     def execute( self ):
         super().execute()
         self.log.info( f"REDIS checking: {self.__redisUrl}")
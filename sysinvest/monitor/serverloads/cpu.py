@@ -17,11 +17,9 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
-from typing import Union
-import psutil
-from threading import Thread, Event, RLock
-import time
+from typing import Callable, Optional, Union
 import statistics
+from sysinvest.common.sampler import SamplerService
 
 class CpuInfo( object ):
     def __init__( self ):
@@ -61,89 +59,57 @@ class MemInfo( object ):
 
 
 
-class SystemLoads( Thread ):
-    def __init__( self ):
-        super().__init__()
-        self.__event = Event()
-        self.__lock = RLock()
-        self.__cpuData = [ [] for i in range( len( psutil.cpu_percent( percpu = True ) ) ) ]
-        self.__memData = []
+class SystemLoads( object ):
+    """The CPU and memory loads, sampled by the shared sampler of the agent"""
+    WINDOWS = ( ( '1 min', 60 ), ( '5 min', 300 ), ( '15 min', 900 ) )
+
+    def __init__( self, interval: Union[int,float] = 5, callback: Optional[Callable] = None ):
+        self.__interval = interval
+        self.__callback = callback
+        self.__cpu = None
+        self.__memory = None
         return
 
     def __getCpuAverages( self ):
         result = {}
-        min1 = 0
-        min5 = 0
-        min15 = 0
-        noCpus = len( self.__cpuData )
-        for core, data in enumerate( self.__cpuData ):
-            result.setdefault( core, {} )
-            cnt = len( data )
-            if cnt >= 12:
-                load = statistics.mean( self.__cpuData[ core ][-13:] )
-                min1 += load
-                result[ core ][ '1 min' ] = load
-                if cnt >= 60:
-                    load = statistics.mean( self.__cpuData[ core ][ -61 : ] )
-                    min5 += load
-                    result[core]['5 min'] = load
-                    if cnt >= 180:
-                        load = statistics.mean( self.__cpuData[ core ] )
-                        min15 += load
-                        result[core]['15 min'] = load
-
-                    else:
-                        result[core]['15 min'] = 0
-
-                else:
-                    result[core]['5 min'] = 0
-                    result[core]['15 min'] = 0
-
-        result[ 'total' ] = {
-            '1 min': min1 / noCpus,
-            '5 min': min5 / noCpus,
-            '15 min': min15 / noCpus
-        }
+        history = self.__cpu.History.window()
+        noCpus = len( history[ -1 ].value )
+        covered = history[ -1 ].timestamp - history[ 0 ].timestamp + self.__cpu.History.Interval
+        totals = {}
+        for label, seconds in self.WINDOWS:
+            since = history[ -1 ].timestamp - seconds
+            samples = [ sample.value for sample in history if sample.timestamp > since ]
+            for core in range( noCpus ):
+                # The average is only valid when the history covers the whole window
+                load = statistics.mean( sample[ core ] for sample in samples ) if covered >= seconds else 0
+                result.setdefault( core, {} )[ label ] = load
+                totals[ label ] = totals.get( label, 0 ) + load
+
+        result[ 'total' ] = { label: totals.get( label, 0 ) / noCpus for label, _ in self.WINDOWS }
         return result
 
-    def stop( self ):
-        self.__event.set()
-        self.join()
+    def start( self ):
+        sampler = SamplerService.instance()
+        self.__memory = sampler.subscribe( 'memory', self.__interval, retention = self.__interval )
+        # The memory is sampled at the same pace, the callback is called once per period
+        self.__cpu = sampler.subscribe( 'cpu', self.__interval, retention = 15 * 60, callback = self.__callback )
         return
 
-    def run( self ):
-        cnt = 0
-        while not self.__event.is_set():
-            start = time.time()
-            self.__lock.acquire()
-            for idx, cpu_pers in enumerate( psutil.cpu_percent(percpu=True) ):
-                self.__cpuData[ idx ].append( cpu_pers )
-
-            self.__lock.release()
-            mem = psutil.virtual_memory()
-            self.__memData.append( MemInfo( mem ) )
-            self.__event.wait( 5 - ( time.time() - start ) )
-            if len( self.__cpuData ) > (12 * 15):
-                self.__lock.acquire()
-                del self.__cpuData[ 0 ]
-                del self.__memData[ 0 ]
-                self.__lock.release()
-
-            cnt += 1
+    def stop( self ):
+        for subscription in ( self.__cpu, self.__memory ):
+            if subscription is not None:
+                subscription.close()
 
+        self.__cpu = self.__memory = None
         return
 
     def getLoadData( self ):
-        result = (None, None)
-        if len( self.__memData ) > 0:
-            self.__lock.acquire()
-            try:
-                result = ( self.__memData[ -1 ], self.__getCpuAverages() )
-
-            except:
-                pass
+        result = ( None, None )
+        if self.__memory is None or self.__cpu is None:
+            return result
 
-            finally:
-                self.__lock.release()
+        mem = self.__memory.History.latest()
+        if mem is not None and self.__cpu.History.latest() is not None:
+            result = ( MemInfo( mem.value ), self.__getCpuAverages() )
 
         return result
@@ -17,64 +17,82 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
-from sysinvest.common.plugin import MonitorPlugin, PluginResult
-import sysinvest.common.api as API
+from typing import Optional
+from sysinvest.common.plugin import StreamingMonitorPlugin, PluginResult
 from sysinvest.monitor.serverloads.cpu import SystemLoads, MemInfo, CpuInfo
 
 
-class ServerLoads( MonitorPlugin ):
+class ServerLoads( StreamingMonitorPlugin ):
     DEFAULT_TEMPLATE = """${message}
 Memory usage:    ${ round( memInfo.Percent, 2 ) }% 
 CPU usage 1 min: ${ round( cpuInfo.get( "total", {} ).get( "1 min" ), 2 ) }% / 5 min: ${ round( cpuInfo.get( "total", {} ).get( "5 min" ), 2 ) }% / 15 min: ${ round( cpuInfo.get( "total", {} ).get( "15 min" ), 2 ) }%"""
     def __init__( self, parent, obj  ):
         super().__init__( parent, obj )
+        self.__setThresholds( obj )
+        self.__thread = SystemLoads( callback = self.changed )
+        self.__thread.start()
+        return
+
+    def __setThresholds( self, obj: dict ) -> None:
         self.__mem_threshold = obj.get( 'threshold', {} ).get( 'memory', 80 )
         self.__cpu_threshold_1_min = obj.get( 'threshold', {} ).get( 'cpu1min', 100 )
         self.__cpu_threshold_5_min = obj.get( 'threshold', {} ).get( 'cpu5min', 90 )
         self.__cpu_threshold_15_min = obj.get( 'threshold', {} ).get( 'cpu15min', 80 )
-        self.__thread = SystemLoads()
-        self.__thread.start()
         return
 
+    def reconfigure( self, config: dict ) -> bool:
+        # The load collecting thread does not depend on the configuration, keep it running
+        super().reconfigure( config )
+        self.__setThresholds( config )
+        return True
+
     def stop( self ):
         # Forward the stop to the thread
         self.__thread.stop()
         return
 
-    def execute( self ) -> bool:
-        super().execute()
-        task_result = PluginResult( self )
+    def stateOf( self, result: PluginResult ):
+        # The exceeded thresholds are in the message
+        return ( result.Result, result.Message )
+
+    def evaluate( self ) -> Optional[PluginResult]:
         memInfo, cpuInfo = self.__thread.getLoadData()
-        self.log.info( "Collecting Memory and CPU data" )
-        if isinstance( memInfo, MemInfo ):
-            messages = []
-            memOk   = True
-            cpuOk   = True
-            if memInfo.Percent >= self.__mem_threshold:
-                messages.append( "Memory threshold exceeded" )
-                memOk   = False
+        if not isinstance( memInfo, MemInfo ):
+            return None
 
-            cpuTotal = cpuInfo.get( 'total', {} )
-            if cpuTotal.get( '1 min' ) >= self.__cpu_threshold_1_min:
-                messages.append( "CPU: 1 minute threshold exceeded" )
-                cpuOk = False
+        task_result = PluginResult( self )
+        self.log.info( "Collecting Memory and CPU data" )
+        messages = []
+        memOk   = True
+        cpuOk   = True
+        if memInfo.Percent >= self.__mem_threshold:
+            messages.append( "Memory threshold exceeded" )
+            memOk   = False
 
-            if cpuTotal.get( '5 min' ) >= self.__cpu_threshold_5_min:
-                messages.append( "CPU: 5 minute threshold exceeded" )
-                cpuOk = False
+        cpuTotal = cpuInfo.get( 'total', {} )
+        if cpuTotal.get( '1 min' ) >= self.__cpu_threshold_1_min:
+            messages.append( "CPU: 1 minute threshold exceeded" )
+            cpuOk = False
 
-            if cpuTotal.get( '15 min' ) >= self.__cpu_threshold_15_min:
-                messages.append( "CPU: 15 minute threshold exceeded" )
-                cpuOk = False
+        if cpuTotal.get( '5 min' ) >= self.__cpu_threshold_5_min:
+            messages.append( "CPU: 5 minute threshold exceeded" )
+            cpuOk = False
 
-            if len( messages ) == 0:
-                messages.append( "Server loads normal" )
+        if cpuTotal.get( '15 min' ) >= self.__cpu_threshold_15_min:
+            messages.append( "CPU: 15 minute threshold exceeded" )
+            cpuOk = False
 
-            task_result.update( memOk and cpuOk, '\n'.join( messages ), memOk = memOk, cpuOk = cpuOk, memInfo = memInfo, cpuInfo = cpuInfo )
+        if len( messages ) == 0:
+            messages.append( "Server loads normal" )
 
-        else:
-            task_result.update( True, "Collecting", memInfo = memInfo((0,0,0)), cpuInfo = {} )
+        task_result.update( memOk and cpuOk, '\n'.join( messages ), memOk = memOk, cpuOk = cpuOk, memInfo = memInfo, cpuInfo = cpuInfo )
+        return task_result
 
-        API.QUEUE.put( task_result )
-        return task_result.Result
+    def execute( self ) -> bool:
+        super().execute()
+        task_result = self.evaluate()
+        if task_result is None:
+            task_result = PluginResult( self )
+            task_result.update( True, "Collecting", memInfo = MemInfo( ( 0, 0, 0 ) ), cpuInfo = {} )
 
+        return self.heartbeat( task_result )
@@ -0,0 +1,93 @@
+#
+#   sysinvest - Python system monitor and investigation utility
+#   Copyright (C) 2022-2023 Marc Bertens-Nguyen m.bertens@pe2mbs.nl
+#
+#   This library is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU Library General Public License GPL-2.0-only
+#   as published by the Free Software Foundation; only version 2 of the
+#   License.
+#
+#   This library is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   Library General Public License for more details.
+#
+#   You should have received a copy of the GNU Library General Public
+#   License GPL-2.0-only along with this library; if not, write to the
+#   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+#   Boston, MA 02110-1301 USA
+#
+import time
+import math
+import random
+from sysinvest.common.plugin import MonitorPlugin, PluginResult
+import sysinvest.common.api as API
+
+
+class SyntheticMonitor( MonitorPlugin ):
+    """Generates load for testing the scheduler, the collector and the reporters.
+
+    attributes:
+        latency:
+            distribution:   constant, uniform, exponential or lognormal
+            mean:           mean duration in seconds
+            min:            lower bound in seconds
+            max:            upper bound in seconds
+            sigma:          for the lognormal distribution
+        mode:               'sleep' to wait, 'busy' to use the CPU
+        failure_rate:       fraction of the runs that fail
+        result_size:        bytes of payload in each result
+        results:            number of results per run
+        seed:               seed for reproducible runs
+    """
+    DEFAULT_TEMPLATE = "${name} => ${result} ${message}"
+
+    def __init__( self, parent, obj: dict ):
+        super().__init__( parent, obj )
+        self.__random = random.Random( self.Attributes.get( 'seed' ) )
+        return
+
+    def duration( self ) -> float:
+        latency = self.Attributes.get( 'latency', {} )
+        distribution = latency.get( 'distribution', 'constant' )
+        mean = float( latency.get( 'mean', 0.0 ) )
+        if distribution == 'uniform':
+            value = self.__random.uniform( float( latency.get( 'min', 0.0 ) ), float( latency.get( 'max', 2 * mean ) ) )
+
+        elif distribution == 'exponential':
+            value = self.__random.expovariate( 1 / mean ) if mean > 0 else 0.0
+
+        elif distribution == 'lognormal':
+            sigma = float( latency.get( 'sigma', 1.0 ) )
+            # mu such that the mean of the distribution is 'mean'
+            value = self.__random.lognormvariate( 0, sigma ) * mean / math.exp( sigma ** 2 / 2 )
+
+        else:
+            value = mean
+
+        return min( max( value, float( latency.get( 'min', 0.0 ) ) ), float( latency.get( 'max', value ) ) )
+
+    def __wait( self, seconds: float ) -> None:
+        if self.Attributes.get( 'mode', 'sleep' ) == 'busy':
+            until = time.perf_counter() + seconds
+            while time.perf_counter() < until:
+                pass
+
+        else:
+            time.sleep( seconds )
+
+        return
+
+    def execute( self ) -> bool:
+        super().execute()
+        self.__wait( self.duration() )
+        ok = self.__random.random() >= float( self.Attributes.get( 'failure_rate', 0.0 ) )
+        payload = 'x' * int( self.Attributes.get( 'result_size', 0 ) )
+        count = int( self.Attributes.get( 'results', 1 ) )
+        for index in range( count ):
+            task_result = PluginResult( self )
+            task_result.update( ok, "Synthetic check passed" if ok else "Synthetic check failed",
+                                payload = payload, sequence = index, enqueued = time.time() )
+            API.QUEUE.put( task_result )
+
+        return ok
@@ -17,6 +17,7 @@
 #   Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
 #   Boston, MA 02110-1301 USA
 #
+from typing import List
 from sysinvest.common.plugin import PluginResult, MonitorPlugin
 from threading import Thread
 from mako.template import Template
@@ -84,7 +85,8 @@ class WriteHtmlPage( ReportPlugin ):
         active = server.get('enabled', False)
         if active:
             self.log.warning( f"Starting web server: {server}")
-            self.__pageThread = Thread( target = startWebServer )
+            # A daemon, so the web server does not keep the process alive
+            self.__pageThread = Thread( target = startWebServer, daemon = True )
             self.__pageThread.start()
         else:
             self.log.warning( "Not starting web server" )
@@ -118,8 +120,15 @@ class WriteHtmlPage( ReportPlugin ):
         return
 
     def notify( self, result: PluginResult ):
+        self.notifyBatch( [ result ] )
+        return
+
+    def notifyBatch( self, results: List[ PluginResult ] ):
+        # The page is rendered and written once for all the results
         self.__lock.acquire()
-        self.__render[ result.Name ] = result
+        for result in results:
+            self.__render[ result.Name ] = result
+
         tm = datetime.now().strftime( "%Y-%m-%d %h:%m" )
         for key, value in self.__render.items():
             self.log.info( f"notify item: {key} = {value}" )